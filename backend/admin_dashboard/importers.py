@@ -0,0 +1,267 @@
+"""
+Bulk user import for clinic onboarding.
+
+Rows (CSV with a header line, or NDJSON) carry the registration fields plus
+optional profile fields; ``password`` is optional (users without one set it
+through the password-reset flow). Per batch the importer:
+
+  1. validates rows with UserImportRowSerializer (no per-row queries),
+  2. rejects emails / mobile numbers repeated in the file or already stored,
+     with one ``__in`` query per field,
+  3. hashes passwords in a process pool,
+  4. inserts users, registration OTPs and their outbox notifications with
+     bulk_create in one transaction.
+
+bulk_create skips User.save(), so patient_uuid and search_document are
+assigned here. Every rejected row is reported with its line number and
+errors; valid rows are imported regardless.
+"""
+import csv
+import io
+import json
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from users.models import NotificationOutbox, OTPVerification, User, generate_otp_code, hash_otp_code
+from users.notifications import OTP_LIFETIME, build_otp_notification
+from users.search import build_search_document
+from .serializers import UserImportRowSerializer
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+
+class ImportTooLarge(ValueError):
+    pass
+
+
+class ImportFileError(ValueError):
+    """The file as a whole cannot be read (encoding, CSV syntax)"""
+
+
+def detect_format(filename='', content_type=''):
+    """'csv' or 'ndjson' from a file name or content type (defaults to csv)"""
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    return 'csv'
+
+
+def read_rows(stream, fmt):
+    """
+    Yield (line number, row dict) from a text stream, dropping empty values.
+    Raises ImportFileError when the file cannot be decoded or parsed.
+    """
+    try:
+        yield from _parse_rows(stream, fmt)
+    except UnicodeDecodeError as e:
+        raise ImportFileError('File must be UTF-8 encoded.') from e
+    except csv.Error as e:
+        raise ImportFileError(f'Invalid CSV file: {e}') from e
+
+
+def _parse_rows(stream, fmt):
+    if fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+                continue
+            if not isinstance(row, dict):
+                yield line_number, ValueError('Each line must be a JSON object.')
+                continue
+            yield line_number, {k: v for k, v in row.items() if v not in ('', None)}
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Header is line 1
+            yield reader.line_num, {
+                k.strip(): v.strip() for k, v in row.items()
+                if k and isinstance(v, str) and v.strip()
+            }
+
+
+def _init_hash_worker():
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+class UserImporter:
+    """Imports rows in batches; ``run`` returns a report dict"""
+    
+    def __init__(self, batch_size=1000, workers=None, send_otp=True, otp_lifetime=OTP_LIFETIME,
+                 dry_run=False):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.send_otp = send_otp
+        self.otp_lifetime = otp_lifetime
+        self.dry_run = dry_run
+        self.created = 0
+        self.errors = []
+        self._seen_emails = set()
+        self._seen_mobiles = set()
+        self._executor = None
+    
+    def run(self, rows):
+        batch = []
+        try:
+            for line_number, row in rows:
+                if isinstance(row, Exception):
+                    self.errors.append({'row': line_number, 'errors': {'non_field_errors': [str(row)]}})
+                    continue
+                batch.append((line_number, row))
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch)
+                    batch = []
+            if batch:
+                self._import_batch(batch)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+        return {
+            'created': self.created,
+            'failed': len(self.errors),
+            'dry_run': self.dry_run,
+            # Uniqueness rejections are found after the serializer errors of their batch
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+        }
+    
+    def _reject(self, line_number, field, message):
+        self.errors.append({'row': line_number, 'errors': {field: [message]}})
+    
+    def _validate(self, batch):
+        """Serializer validation plus in-file and set-based database uniqueness checks"""
+        candidates = []
+        for line_number, row in batch:
+            serializer = UserImportRowSerializer(data=row)
+            if not serializer.is_valid():
+                self.errors.append({'row': line_number, 'errors': serializer.errors})
+                continue
+            data = serializer.validated_data
+            data['email'] = User.objects.normalize_email(data['email'])
+            if data['email'] in self._seen_emails:
+                self._reject(line_number, 'email', 'Duplicate email in import file.')
+                continue
+            if data['mobile_number'] in self._seen_mobiles:
+                self._reject(line_number, 'mobile_number', 'Duplicate mobile number in import file.')
+                continue
+            self._seen_emails.add(data['email'])
+            self._seen_mobiles.add(data['mobile_number'])
+            candidates.append((line_number, data))
+        
+        existing_emails = set(User.objects.filter(
+            email__in=[data['email'] for _, data in candidates]
+        ).values_list('email', flat=True))
+        existing_mobiles = set(User.objects.filter(
+            mobile_number__in=[data['mobile_number'] for _, data in candidates]
+        ).values_list('mobile_number', flat=True))
+        
+        valid = []
+        for line_number, data in candidates:
+            if data['email'] in existing_emails:
+                self._reject(line_number, 'email', 'A user with this email already exists.')
+            elif data['mobile_number'] in existing_mobiles:
+                self._reject(line_number, 'mobile_number', 'A user with this mobile number already exists.')
+            else:
+                valid.append((line_number, data))
+        return valid
+    
+    def _hash_passwords(self, passwords):
+        """make_password for each entry; rows without a password get an unusable one"""
+        to_hash = [(i, p) for i, p in enumerate(passwords) if p]
+        hashes = [make_password(None) for _ in passwords]
+        if len(to_hash) > 1 and self.workers != 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers or os.cpu_count(), initializer=_init_hash_worker
+                )
+            chunksize = max(1, len(to_hash) // ((self.workers or os.cpu_count() or 1) * 4))
+            results = self._executor.map(make_password, [p for _, p in to_hash], chunksize=chunksize)
+        else:
+            results = map(make_password, [p for _, p in to_hash])
+        for (i, _), encoded in zip(to_hash, results):
+            hashes[i] = encoded
+        return hashes
+    
+    def _build(self, valid):
+        hashes = self._hash_passwords([data.pop('password', None) for _, data in valid])
+        users = []
+        for (_, data), encoded in zip(valid, hashes):
+            user = User(id=uuid.uuid4(), password=encoded, is_active=False, **data)
+            # bulk_create bypasses User.save()
+            if user.role == 'PATIENT':
+                user.patient_uuid = uuid.uuid4()
+            user.search_document = build_search_document(user)
+            users.append(user)
+        return users
+    
+    def _insert(self, users):
+        User.objects.bulk_create(users)
+        if not self.send_otp:
+            return
+        expires_at = timezone.now() + self.otp_lifetime
+        otps, notifications = [], []
+        for user in users:
+            code = generate_otp_code()
+            otps.append(OTPVerification(
+                user=user,
+                otp_code=hash_otp_code(user.pk, 'REGISTRATION', code),
+                purpose='REGISTRATION',
+                expires_at=expires_at,
+            ))
+            notifications.append(build_otp_notification(user, 'REGISTRATION', code, expires_at))
+        OTPVerification.objects.bulk_create(otps)
+        NotificationOutbox.objects.bulk_create(notifications)
+    
+    def _import_batch(self, batch):
+        valid = self._validate(batch)
+        if not valid:
+            return
+        users = self._build(valid)
+        if self.dry_run:
+            self.created += len(users)
+            return
+        try:
+            with transaction.atomic():
+                self._insert(users)
+            self.created += len(users)
+        except IntegrityError:
+            # A concurrent registration took an email/mobile; retry row by row
+            for (line_number, _), user in zip(valid, users):
+                try:
+                    with transaction.atomic():
+                        self._insert([user])
+                    self.created += 1
+                except IntegrityError:
+                    self._reject(line_number, 'non_field_errors',
+                                 'A user with this email or mobile number already exists.')
+
+
+def import_users(fileobj, fmt='csv', max_rows=None, **options):
+    """
+    Import from a binary or text file object; see UserImporter for options.
+    With ``max_rows`` a longer file raises ImportTooLarge, and an unreadable one
+    ImportFileError, before anything is imported.
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f'Unsupported import format: {fmt}')
+    stream = fileobj
+    if not isinstance(fileobj, io.TextIOBase):
+        stream = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    rows = read_rows(stream, fmt)
+    if max_rows is not None:
+        rows = list(islice(rows, max_rows + 1))
+        if len(rows) > max_rows:
+            raise ImportTooLarge(f'At most {max_rows} rows can be imported per upload.')
+    return UserImporter(**options).run(rows)
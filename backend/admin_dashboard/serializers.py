@@ -1,8 +1,9 @@
 from rest_framework import serializers
+from django.contrib.auth.password_validation import validate_password
 from users.models import User
 from records.models import MedicalRecord
 from sharing.models import ShareToken, AccessLog
-from users.serializers import UserProfileSerializer
+from users.serializers import UserProfileField
 from records.serializers import MedicalRecordListSerializer
 
 
@@ -42,16 +43,37 @@ class AdminStatisticsSerializer(serializers.Serializer):
 
 class AdminAccessLogSerializer(serializers.ModelSerializer):
     """Admin serializer for access logs"""
-    doctor_info = UserProfileSerializer(source='doctor', read_only=True)
-    patient_info = UserProfileSerializer(source='patient', read_only=True)
+    doctor_info = UserProfileField(source='doctor')
+    patient_info = UserProfileField(source='patient')
     records_info = MedicalRecordListSerializer(source='accessed_records', many=True, read_only=True)
+    session_duration = serializers.DurationField(read_only=True)
     
     class Meta:
         model = AccessLog
         fields = (
             'id', 'doctor', 'doctor_info', 'patient', 'patient_info',
             'accessed_records', 'records_info', 'ip_address', 'user_agent',
-            'accessed_at', 'share_token'
+            'accessed_at', 'last_activity_at', 'request_count', 'session_duration', 'share_token'
         )
         read_only_fields = ('id', 'accessed_at')
 
+
+class UserImportRowSerializer(serializers.Serializer):
+    """One row of a bulk user import (uniqueness is checked per batch by the importer)"""
+    email = serializers.EmailField()
+    mobile_number = serializers.CharField(max_length=15)
+    full_name = serializers.CharField(max_length=255)
+    role = serializers.ChoiceField(choices=['PATIENT', 'DOCTOR'])
+    password = serializers.CharField(required=False, allow_blank=True, write_only=True)
+    date_of_birth = serializers.DateField(required=False, allow_null=True)
+    gender = serializers.CharField(max_length=10, required=False, allow_blank=True, allow_null=True)
+    blood_group = serializers.CharField(max_length=5, required=False, allow_blank=True, allow_null=True)
+    allergies = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    chronic_conditions = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    specialization = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+    license_number = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    
+    def validate_password(self, value):
+        if value:
+            validate_password(value)
+        return value
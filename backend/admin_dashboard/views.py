@@ -1,13 +1,21 @@
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, Max, Sum, Q
+from django.views.decorators.http import condition
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from .importers import IMPORT_FORMATS, ImportFileError, ImportTooLarge, detect_format, import_users
 from .serializers import AdminUserSerializer, AdminStatisticsSerializer, AdminAccessLogSerializer
 from users.models import User
+from users.resolver import resolve_patient
+from users.search import search_users
 from records.models import MedicalRecord
 from sharing.models import ShareToken, AccessLog
+from sharing.downloads import serve_record_file
+from sharing.http import make_etag
 
 User = get_user_model()
 
@@ -68,12 +76,59 @@ class UserListView(generics.ListAPIView):
     permission_classes = [IsSuperAdmin]
     serializer_class = AdminUserSerializer
     filter_fields = ['role', 'is_active', 'is_verified']
-    search_fields = ['email', 'full_name', 'mobile_number', 'patient_uuid']
     
     def get_queryset(self):
+        term = self.request.query_params.get('search')
+        if term:
+            # Ordered by relevance for free text, newest first otherwise
+            return search_users(User.objects.order_by('-created_at'), term)
         return User.objects.all().order_by('-created_at')
 
 
+@api_view(['POST'])
+@permission_classes([IsSuperAdmin])
+@parser_classes([MultiPartParser])
+def import_users_view(request):
+    """
+    Bulk-create users from an uploaded CSV or NDJSON file (field ``file``).
+    Uploads are capped (ADMIN_IMPORT_MAX_BYTES / ADMIN_IMPORT_MAX_ROWS) and
+    hashed in this process; larger files go through the import_users command.
+    """
+    upload = request.FILES.get('file')
+    if not upload:
+        return Response({'error': 'File is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if upload.size > getattr(settings, 'ADMIN_IMPORT_MAX_BYTES', 1024 * 1024):
+        return Response(
+            {'error': 'File too large. Use the import_users management command.'},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+    
+    fmt = request.data.get('format') or detect_format(upload.name, upload.content_type)
+    if fmt not in IMPORT_FORMATS:
+        return Response({'error': 'Format must be csv or ndjson.'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+    upload.open('rb')
+    try:
+        # No process pool inside an application-server worker
+        report = import_users(
+            upload.file, fmt, max_rows=getattr(settings, 'ADMIN_IMPORT_MAX_ROWS', 1000),
+            workers=1, dry_run=dry_run
+        )
+    except ImportTooLarge as e:
+        return Response(
+            {'error': f'{e} Use the import_users management command.'},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+    except ImportFileError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(report)
+
+
 class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete user"""
     permission_classes = [IsSuperAdmin]
@@ -131,8 +186,27 @@ def reset_user_password(request, user_id):
         )
 
 
+def _patient_records_etag(request, patient_id):
+    return make_etag(
+        request,
+        User.objects.filter(id=patient_id).values_list('updated_at', flat=True).first(),
+        MedicalRecord.objects.filter(patient_id=patient_id, is_deleted=False).aggregate(
+            count=Count('pk'), updated=Max('updated_at')
+        ),
+    )
+
+
+def _access_logs_etag(access_logs):
+    # updated_at also moves when a record is opened or a doctor/patient profile changes
+    return access_logs.aggregate(
+        count=Count('pk'), accessed=Max('accessed_at'), active=Max('last_activity_at'),
+        updated=Max('updated_at'),
+    )
+
+
 @api_view(['GET'])
 @permission_classes([IsSuperAdmin])
+@condition(etag_func=_patient_records_etag)
 def patient_records(request, patient_id):
     """Get all records for a patient"""
     try:
@@ -153,59 +227,102 @@ def patient_records(request, patient_id):
         )
 
 
+@api_view(['GET'])
+@permission_classes([IsSuperAdmin])
+def patient_record_file(request, patient_id, record_id):
+    """Download a patient's record file (supports Range and conditional GET)"""
+    try:
+        record = MedicalRecord.objects.get(id=record_id, patient_id=patient_id, is_deleted=False)
+    except MedicalRecord.DoesNotExist:
+        return Response(
+            {'error': 'Record not found.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    return serve_record_file(request, record)
+
+
 class AccessLogListView(generics.ListAPIView):
     """List all access logs"""
     permission_classes = [IsSuperAdmin]
     serializer_class = AdminAccessLogSerializer
     filter_fields = ['doctor', 'patient']
-    search_fields = ['doctor__full_name', 'patient__full_name', 'patient__patient_uuid']
     
     def get_queryset(self):
-        return AccessLog.objects.all().order_by('-accessed_at')
+        queryset = AccessLog.objects.select_related('doctor', 'patient').prefetch_related(
+            'accessed_records'
+        ).order_by('-accessed_at')
+        term = self.request.query_params.get('search')
+        if term:
+            matches = search_users(User.objects.all(), term, rank=False).values('pk')
+            queryset = queryset.filter(Q(doctor__in=matches) | Q(patient__in=matches))
+        return queryset
+
+
+def _audit_trail_etag(request, patient_uuid):
+    patient = resolve_patient(patient_uuid)
+    if patient is None:
+        return None
+    return make_etag(
+        request,
+        patient.updated_at,
+        ShareToken.objects.filter(patient=patient).aggregate(
+            count=Count('pk'),
+            created=Max('created_at'),
+            revoked=Max('revoked_at'),
+            accesses=Sum('current_access_count'),
+        ),
+        _access_logs_etag(AccessLog.objects.filter(patient=patient)),
+    )
 
 
 @api_view(['GET'])
 @permission_classes([IsSuperAdmin])
+@condition(etag_func=_audit_trail_etag)
 def audit_trail(request, patient_uuid):
     """Get audit trail for a patient UUID"""
-    try:
-        patient = User.objects.get(patient_uuid=patient_uuid, role='PATIENT')
-        
-        # Get all share tokens for this patient
-        share_tokens = ShareToken.objects.filter(patient=patient)
-        
-        # Get all access logs for this patient
-        access_logs = AccessLog.objects.filter(patient=patient)
-        
-        return Response({
-            'patient': AdminUserSerializer(patient).data,
-            'share_tokens_count': share_tokens.count(),
-            'share_tokens': [
-                {
-                    'id': str(token.id),
-                    'share_method': token.share_method,
-                    'created_at': token.created_at,
-                    'expires_at': token.expires_at,
-                    'is_revoked': token.is_revoked,
-                    'access_count': token.current_access_count,
-                }
-                for token in share_tokens
-            ],
-            'access_logs_count': access_logs.count(),
-            'access_logs': AdminAccessLogSerializer(access_logs, many=True, context={'request': request}).data
-        })
-    except User.DoesNotExist:
+    patient = resolve_patient(patient_uuid)
+    if patient is None:
         return Response(
             {'error': 'Patient not found.'},
             status=status.HTTP_404_NOT_FOUND
         )
+    
+    # Get all share tokens for this patient
+    share_tokens = ShareToken.objects.filter(patient=patient)
+    
+    # Get all access logs for this patient
+    access_logs = AccessLog.objects.filter(patient=patient).select_related(
+        'doctor', 'patient'
+    ).prefetch_related('accessed_records')
+    
+    return Response({
+        'patient': AdminUserSerializer(patient).data,
+        'share_tokens_count': share_tokens.count(),
+        'share_tokens': [
+            {
+                'id': str(token.id),
+                'share_method': token.share_method,
+                'created_at': token.created_at,
+                'expires_at': token.expires_at,
+                'is_revoked': token.is_revoked,
+                'access_count': token.current_access_count,
+            }
+            for token in share_tokens
+        ],
+        'access_logs_count': access_logs.count(),
+        'access_logs': AdminAccessLogSerializer(access_logs, many=True, context={'request': request}).data
+    })
 
 
 @api_view(['GET'])
 @permission_classes([IsSuperAdmin])
+@condition(etag_func=lambda request: make_etag(request, _access_logs_etag(AccessLog.objects.all())))
 def export_access_logs(request):
     """Export access logs (placeholder for CSV/PDF export)"""
-    logs = AccessLog.objects.all().order_by('-accessed_at')
+    logs = AccessLog.objects.select_related('doctor', 'patient').prefetch_related(
+        'accessed_records'
+    ).order_by('-accessed_at')
     serializer = AdminAccessLogSerializer(logs, many=True, context={'request': request})
     
     # TODO: Implement CSV/PDF export
@@ -0,0 +1,131 @@
+"""
+Batch reads: several GET requests against the users, sharing and
+admin_dashboard APIs in one round trip (POST /api/sharing/batch/).
+
+Each sub-request is resolved against the project URLconf and dispatched
+straight to its view, skipping the middleware stack. The outer request's
+user is handed to every sub-request as already authenticated, so the bearer
+token is checked once; each view still applies its own permissions and
+throttles. Sub-requests run in order on the request's database connection.
+With ``parallel`` they run on up to BATCH_MAX_WORKERS threads instead; each
+thread opens (and closes) its own connection, which only pays off on a
+database server with latency, not on SQLite.
+
+Only DRF responses are embedded (their data, before rendering); file, image
+and other non-JSON responses are reported as errors.
+"""
+import copy
+import io
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.http import Http404
+from django.urls import Resolver404, resolve
+from rest_framework.response import Response
+
+BATCH_APPS = ('users', 'sharing', 'admin_dashboard')
+
+# Outer request headers that must not leak into the sub-requests
+_DROPPED_META = (
+    'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE',
+    'HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE', 'HTTP_RANGE', 'HTTP_IF_RANGE',
+)
+
+
+class BatchError(ValueError):
+    pass
+
+
+def max_requests():
+    return getattr(settings, 'BATCH_MAX_REQUESTS', 10)
+
+
+def parse_batch(data):
+    """[(id, path, query string, resolver match)] for the request body; raises BatchError"""
+    items = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError('requests must be a non-empty list.')
+    if len(items) > max_requests():
+        raise BatchError(f'At most {max_requests()} requests per batch.')
+    
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise BatchError(f'requests[{index}]: path is required.')
+        if item.get('method', 'GET').upper() != 'GET':
+            raise BatchError(f'requests[{index}]: only GET requests can be batched.')
+        url = urlsplit(item['path'])
+        if url.scheme or url.netloc or not url.path.startswith('/api/'):
+            raise BatchError(f'requests[{index}]: path must start with /api/.')
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            match = None
+        if match is not None and (
+            match.func.__module__.split('.')[0] not in BATCH_APPS
+            or match.url_name == 'batch'
+        ):
+            raise BatchError(f'requests[{index}]: {url.path} cannot be batched.')
+        parsed.append((item.get('id', index), url.path, url.query, match))
+    return parsed
+
+
+def _sub_request(request, path, query, match):
+    """GET request for ``path`` carrying the outer request's headers and user"""
+    environ = {
+        key: value for key, value in request._request.META.items() if key not in _DROPPED_META
+    }
+    environ.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': query,
+        'wsgi.input': io.BytesIO(b''),
+    })
+    sub_request = WSGIRequest(environ)
+    sub_request.resolver_match = match
+    # DRF's forced authentication: the views skip the JWT check; a copy so
+    # get_full_user() and deferred loads don't race between threads
+    sub_request._force_auth_user = copy.copy(request.user)
+    sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def _dispatch(request, path, query, match):
+    if match is None:
+        return 404, {'error': 'Not found.'}
+    try:
+        response = match.func(_sub_request(request, path, query, match), *match.args, **match.kwargs)
+    except Http404:
+        return 404, {'error': 'Not found.'}
+    if not isinstance(response, Response):
+        return response.status_code, {'error': 'Response type cannot be batched.'}
+    return response.status_code, response.data
+
+
+def _dispatch_in_thread(request, path, query, match):
+    try:
+        return _dispatch(request, path, query, match)
+    finally:
+        connections.close_all()
+
+
+def run_batch(request, parsed, parallel=False):
+    """[{'id', 'status', 'body'}] in request order"""
+    workers = min(getattr(settings, 'BATCH_MAX_WORKERS', 4), len(parsed))
+    if parallel and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_dispatch_in_thread, request, path, query, match)
+                for _, path, query, match in parsed
+            ]
+            results = [future.result() for future in futures]
+    else:
+        results = [_dispatch(request, path, query, match) for _, path, query, match in parsed]
+    return [
+        {'id': request_id, 'status': status_code, 'body': body}
+        for (request_id, _, _, _), (status_code, body) in zip(parsed, results)
+    ]
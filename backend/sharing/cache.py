@@ -0,0 +1,61 @@
+"""
+Small caches for hot read paths.
+
+Cached values are never the source of truth for authorization: callers still
+load the ShareToken row and check ``is_valid()`` on every request, so a
+revocation takes effect immediately in every process even if a stale entry
+is still cached somewhere.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from users.cache import TTLCache
+from .utils import decrypt_token
+
+# Decrypted share token payloads, keyed by token id.
+# SHARE_TOKEN_CACHE_BACKEND names an optional Django cache alias shared
+# between processes; the in-process LRU is always consulted first.
+_token_payloads = TTLCache(
+    maxsize=getattr(settings, 'SHARE_TOKEN_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'SHARE_TOKEN_CACHE_TTL', 300),
+)
+
+
+def _shared_cache():
+    alias = getattr(settings, 'SHARE_TOKEN_CACHE_BACKEND', None)
+    return caches[alias] if alias else None
+
+
+def _payload_cache_key(token_id):
+    return f'sharing:token-payload:{token_id}'
+
+
+def get_token_payload(share_token):
+    """Return the decrypted payload of a ShareToken, decrypting at most once per TTL"""
+    key = str(share_token.pk)
+    payload = _token_payloads.get(key)
+    if payload is not None:
+        return payload
+    
+    shared = _shared_cache()
+    if shared is not None:
+        payload = shared.get(_payload_cache_key(key))
+    if payload is None:
+        payload = decrypt_token(share_token.encrypted_token)
+    
+    # Never keep a payload past the token's own expiry
+    ttl = min(_token_payloads.ttl, int((share_token.expires_at - timezone.now()).total_seconds()))
+    if ttl > 0:
+        _token_payloads.set(key, payload, ttl)
+        if shared is not None:
+            shared.set(_payload_cache_key(key), payload, ttl)
+    return payload
+
+
+def invalidate_token_payload(token_id):
+    """Drop a cached payload (on revoke, expiry or exhausted access count)"""
+    _token_payloads.delete(str(token_id))
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_payload_cache_key(token_id))
@@ -0,0 +1,167 @@
+"""
+Delivery of medical record files: HTTP Range requests, strong ETags with
+conditional GETs, and offload of plaintext files to the web server.
+"""
+import hashlib
+import mimetypes
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+)
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+from .utils import decrypt_chunks, decrypt_range, is_stream_encrypted, stream_plaintext_size
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def record_etag(record):
+    """Strong ETag for a record file, derived from its identity and last update"""
+    digest = hashlib.sha256(
+        f'{record.id}:{record.updated_at.isoformat()}:{record.file_size}'.encode()
+    ).hexdigest()[:32]
+    return quote_etag(digest)
+
+
+def parse_range_header(header, size):
+    """
+    Parse a single-range ``Range: bytes=...`` header.
+    
+    Returns (start, end) inclusive, None when the header should be ignored
+    (absent, malformed or multi-range), or False when unsatisfiable.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    spec = header[len('bytes='):].strip()
+    if ',' in spec or '-' not in spec:
+        return None
+    
+    first, last = (part.strip() for part in spec.split('-', 1))
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the final N bytes
+            suffix = int(last)
+            if suffix == 0:
+                return False
+            start = max(0, size - suffix)
+            end = size - 1
+    except ValueError:
+        return None
+    
+    if start >= size:
+        return False
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _iter_file_range(file, start, length):
+    file.seek(start)
+    while length > 0:
+        data = file.read(min(READ_BLOCK_SIZE, length))
+        if not data:
+            break
+        length -= len(data)
+        yield data
+    file.close()
+
+
+def _iter_and_close(chunks, file):
+    try:
+        yield from chunks
+    finally:
+        file.close()
+
+
+def _offload_response(record):
+    """Hand the transfer to the web server (FILE_OFFLOAD: 'x-accel-redirect' or 'x-sendfile')"""
+    offload = getattr(settings, 'FILE_OFFLOAD', None)
+    if offload == 'x-accel-redirect':
+        response = HttpResponse()
+        prefix = getattr(settings, 'FILE_OFFLOAD_PREFIX', '/protected/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(record.file.name)
+        return response
+    if offload == 'x-sendfile':
+        try:
+            path = record.file.path
+        except NotImplementedError:
+            # Storage without local paths (e.g. object storage): stream instead
+            return None
+        response = HttpResponse()
+        response['X-Sendfile'] = path
+        return response
+    return None
+
+
+def serve_record_file(request, record):
+    """
+    Build the download response for a record whose access has already been
+    authorized by the caller.
+    
+    Plaintext files are offloaded to the web server when configured, or sent
+    with FileResponse (wsgi.file_wrapper/sendfile). Streaming-encrypted files
+    are decrypted segment by segment, so Range requests only decrypt the
+    segments they cover.
+    """
+    etag = record_etag(record)
+    if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    
+    content_type = mimetypes.guess_type(record.file_name)[0] or 'application/octet-stream'
+    file = record.file.open('rb')
+    encrypted = is_stream_encrypted(file)
+    
+    if not encrypted:
+        response = _offload_response(record)
+        if response is not None:
+            # The web server handles Range and conditional requests itself
+            file.close()
+            response['Content-Type'] = content_type
+            response['ETag'] = etag
+            response['Content-Disposition'] = content_disposition_header(False, record.file_name)
+            return response
+    
+    size = stream_plaintext_size(file) if encrypted else record.file.size
+    
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range or if_range == etag:
+        byte_range = parse_range_header(request.META.get('HTTP_RANGE'), size)
+    
+    if byte_range is False:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        if encrypted:
+            chunks = _iter_and_close(decrypt_range(file, start, length), file)
+        else:
+            chunks = _iter_file_range(file, start, length)
+        response = StreamingHttpResponse(chunks, status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    elif encrypted:
+        file.seek(0)
+        response = StreamingHttpResponse(_iter_and_close(decrypt_chunks(file), file), content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        file.seek(0)
+        response = FileResponse(file, content_type=content_type)
+    
+    response['Content-Disposition'] = content_disposition_header(False, record.file_name)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(record.updated_at.timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,148 @@
+"""
+Benchmark nested user-profile serialization and JSON rendering on an
+access-log page, and check FastJSONRenderer against DRF's JSONRenderer.
+
+Usage: python manage.py benchmark_serializers --rows 1000 [--database]
+
+--database additionally renders up to --rows stored objects through every
+ModelSerializer in users, sharing and admin_dashboard with both renderers
+and fails on the first byte difference.
+"""
+import inspect
+import time
+import uuid
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from admin_dashboard import serializers as admin_serializers
+from sharing import serializers as sharing_serializers
+from sharing.models import AccessLog
+from sharing.renderers import FastJSONRenderer, use_orjson
+from users import serializers as user_serializers
+from users.models import User
+from users.serializers import UserProfileField, UserProfileSerializer
+
+
+class NestedProfileAccessLogSerializer(serializers.ModelSerializer):
+    """Access log profiles via nested ModelSerializers (previous implementation)"""
+    doctor_info = UserProfileSerializer(source='doctor', read_only=True)
+    patient_info = UserProfileSerializer(source='patient', read_only=True)
+    
+    class Meta:
+        model = AccessLog
+        fields = ('id', 'doctor', 'doctor_info', 'patient', 'patient_info', 'accessed_at')
+
+
+class CompiledProfileAccessLogSerializer(serializers.ModelSerializer):
+    """Access log profiles via the compiled UserProfileField"""
+    doctor_info = UserProfileField(source='doctor')
+    patient_info = UserProfileField(source='patient')
+    
+    class Meta:
+        model = AccessLog
+        fields = ('id', 'doctor', 'doctor_info', 'patient', 'patient_info', 'accessed_at')
+
+
+def _make_user(role, index):
+    now = timezone.now()
+    return User(
+        id=uuid.uuid4(),
+        email=f'{role.lower()}{index}@example.com',
+        mobile_number=f'+1555{index:07d}',
+        full_name=f'{role.title()} {index}',
+        role=role,
+        patient_uuid=uuid.uuid4() if role == 'PATIENT' else None,
+        date_of_birth=date(1980, 1, 1) if role == 'PATIENT' else None,
+        blood_group='O+' if role == 'PATIENT' else None,
+        specialization='Cardiology' if role == 'DOCTOR' else None,
+        is_verified=True,
+        created_at=now,
+        updated_at=now,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare nested ModelSerializer and compiled profile serialization (in memory, no DB)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--database', action='store_true',
+                            help='Also compare renderers over stored rows for every ModelSerializer')
+    
+    def _best_of(self, repeat, func):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+    
+    def handle(self, *args, **options):
+        logs = []
+        for index in range(options['rows']):
+            log = AccessLog(
+                id=uuid.uuid4(),
+                doctor=_make_user('DOCTOR', index),
+                patient=_make_user('PATIENT', index),
+            )
+            log.accessed_at = timezone.now()
+            logs.append(log)
+        
+        renderer = JSONRenderer()
+        results = {}
+        for serializer_class in (NestedProfileAccessLogSerializer, CompiledProfileAccessLogSerializer):
+            best, data = self._best_of(options['repeat'], lambda: serializer_class(logs, many=True).data)
+            results[serializer_class.__name__] = (best, renderer.render(data))
+        
+        nested_time, nested_body = results['NestedProfileAccessLogSerializer']
+        compiled_time, compiled_body = results['CompiledProfileAccessLogSerializer']
+        if nested_body != compiled_body:
+            raise CommandError('Compiled profile output differs from UserProfileSerializer output.')
+        
+        self.stdout.write(
+            f"{options['rows']} rows: nested {nested_time * 1000:.1f} ms, "
+            f"compiled {compiled_time * 1000:.1f} ms (x{nested_time / compiled_time:.2f}), "
+            f"output identical ({len(compiled_body)} bytes)"
+        )
+        
+        if not use_orjson():
+            self.stdout.write('orjson not installed or API_JSON_BACKEND is not "orjson"; skipping renderer comparison')
+            return
+        
+        stdlib_time, stdlib_body = self._best_of(options['repeat'], lambda: renderer.render(data))
+        fast_time, fast_body = self._best_of(options['repeat'], lambda: FastJSONRenderer().render(data))
+        if stdlib_body != fast_body:
+            raise CommandError('FastJSONRenderer output differs from JSONRenderer output.')
+        self.stdout.write(
+            f"render: JSONRenderer {stdlib_time * 1000:.1f} ms, "
+            f"FastJSONRenderer {fast_time * 1000:.1f} ms (x{stdlib_time / fast_time:.2f}), output identical"
+        )
+        
+        if options['database']:
+            self._compare_stored(options['rows'])
+    
+    def _compare_stored(self, rows):
+        """Render stored objects through every ModelSerializer with both renderers"""
+        for module in (user_serializers, sharing_serializers, admin_serializers):
+            for name, serializer_class in inspect.getmembers(module, inspect.isclass):
+                if (
+                    not issubclass(serializer_class, serializers.ModelSerializer)
+                    or serializer_class.__module__ != module.__name__
+                ):
+                    continue
+                objects = list(serializer_class.Meta.model.objects.all()[:rows])
+                try:
+                    data = serializer_class(objects, many=True).data
+                except (KeyError, AttributeError) as exc:
+                    # Serializers needing request/view context (e.g. URL fields)
+                    self.stdout.write(f'{module.__name__}.{name}: skipped ({exc!r})')
+                    continue
+                if JSONRenderer().render(data) != FastJSONRenderer().render(data):
+                    raise CommandError(f'{module.__name__}.{name}: renderer output differs')
+                self.stdout.write(f'{module.__name__}.{name}: {len(objects)} objects identical')
@@ -0,0 +1,13 @@
+"""
+Re-encrypt live share tokens from the legacy RSA envelope to the AEAD format.
+
+Usage: python manage.py migrate_share_tokens --batch-size 500 [--dry-run]
+"""
+from .rotate_encryption_keys import Command as RotateEncryptionKeysCommand
+
+
+class Command(RotateEncryptionKeysCommand):
+    help = 'Convert live URL share tokens from the RSA envelope to AEAD tokens'
+    
+    legacy_only = True
+    live_only = True
@@ -0,0 +1,32 @@
+"""
+Delete sync tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS.
+
+Usage: python manage.py prune_sync_tombstones [--batch-size 5000]
+
+Clients whose cursor predates the cutoff get 410 from the sync endpoint and
+start over without a cursor.
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sharing.models import SyncTombstone
+from sharing.sync import tombstone_retention
+
+
+class Command(BaseCommand):
+    help = 'Delete sync tombstones past the retention period'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+    
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - tombstone_retention()
+        deleted = 0
+        while True:
+            batch = list(SyncTombstone.objects.filter(
+                deleted_at__lt=cutoff
+            ).values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            deleted += SyncTombstone.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstones older than {cutoff:%Y-%m-%d}"))
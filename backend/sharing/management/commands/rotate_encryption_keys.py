@@ -0,0 +1,111 @@
+"""
+Re-encrypt stored share tokens under the primary master key.
+
+Rotation procedure:
+  1. Put the new key first in ENCRYPTION_KEYS (old keys stay listed,
+     decrypt-only); move a retired RSA key to RSA_OLD_PRIVATE_KEY_PATHS.
+  2. Deploy, then run: python manage.py rotate_encryption_keys --sleep 0.5
+  3. Once it reports nothing left (and QR tokens under old keys have
+     expired), drop the old keys from settings.
+
+The job is safe to stop and re-run: rows already under the primary key are
+skipped, --start-after resumes from the last reported checkpoint, and each
+row is updated on its own with a compare-and-swap, so no table lock is held.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sharing.models import ShareToken
+from sharing.utils import (
+    decrypt_many, decrypt_token, encrypt_token, get_master_keys, is_legacy_token,
+    needs_rotation
+)
+
+
+class Command(BaseCommand):
+    help = 'Re-encrypt share tokens that are not under the primary encryption key'
+    
+    # Overridden by migrate_share_tokens
+    legacy_only = False
+    live_only = False
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--start-after', default=None, help='Resume after this token id')
+        parser.add_argument('--dry-run', action='store_true', help='Report without writing')
+    
+    def handle(self, *args, **options):
+        primary_key = get_master_keys()[0]
+        
+        tokens = ShareToken.objects.order_by('pk')
+        if self.live_only:
+            tokens = tokens.filter(is_revoked=False, expires_at__gt=timezone.now())
+        
+        rotated = failed = skipped_qr = 0
+        last_pk = options['start_after']
+        while True:
+            batch = tokens
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(batch.values_list('pk', 'share_method', 'encrypted_token')[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            
+            pending = []
+            for pk, share_method, token in batch:
+                if self.legacy_only and not is_legacy_token(token):
+                    continue
+                if not needs_rotation(token):
+                    continue
+                if share_method == 'QR_CODE':
+                    # Printed QR codes carry the ciphertext itself and scans look
+                    # tokens up by value, so these stay readable via the old key
+                    # until they expire (7 days at most).
+                    skipped_qr += 1
+                    continue
+                pending.append((pk, token))
+            
+            payloads = self._decrypt(pending)
+            for (pk, token), payload in zip(pending, payloads):
+                if isinstance(payload, Exception):
+                    failed += 1
+                    self.stderr.write(f"Token {pk}: {payload}")
+                    continue
+                if not options['dry_run']:
+                    # Only replace the value we read, so a concurrent write wins
+                    ShareToken.objects.filter(pk=pk, encrypted_token=token).update(
+                        encrypted_token=encrypt_token(payload, primary_key),
+                        updated_at=timezone.now()
+                    )
+                rotated += 1
+            
+            self.stdout.write(
+                f"Checkpoint {last_pk}: {rotated} rotated, {failed} failed, "
+                f"{skipped_qr} QR tokens left on old keys"
+            )
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {rotated} rotated, {failed} failed, {skipped_qr} QR tokens left on old keys"
+        ))
+    
+    def _decrypt(self, pending):
+        """Decrypt a batch, sending legacy RSA tokens to the crypto executor"""
+        legacy = [token for _, token in pending if is_legacy_token(token)]
+        legacy_payloads = iter(decrypt_many(legacy, return_exceptions=True))
+        
+        payloads = []
+        for _, token in pending:
+            if is_legacy_token(token):
+                payloads.append(next(legacy_payloads))
+                continue
+            try:
+                payloads.append(decrypt_token(token))
+            except ValueError as e:
+                payloads.append(e)
+        return payloads
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sharing', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accesslog',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='accesslog',
+            name='request_count',
+            field=models.IntegerField(default=1),
+        ),
+    ]
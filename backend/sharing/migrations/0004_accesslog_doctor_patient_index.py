@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sharing', '0003_accesslog_last_activity_at_accesslog_request_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accesslog',
+            index=models.Index(fields=['doctor', 'patient', 'accessed_at'], name='access_logs_doctor__f6829c_idx'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+from django.db import migrations
+
+POSTGRESQL_CREATE = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    "CREATE INDEX doctor_notes_search_gin ON doctor_notes "
+    "USING gin (doctor_id, to_tsvector('simple', coalesce(note_text, '')))",
+    "CREATE INDEX saved_patients_search_gin ON saved_patients "
+    "USING gin (doctor_id, to_tsvector('simple', coalesce(consultation_notes, '')))",
+]
+
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS doctor_notes_search_gin",
+    "DROP INDEX IF EXISTS saved_patients_search_gin",
+]
+
+
+def _sqlite_statements(table, fts, text):
+    """FTS5 table keyed by the source rowid, with the doctor id indexed as a 'd<hex>' token"""
+    values = f"'d' || {{row}}.doctor_id, {{row}}.{text}"
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5(doctor_key, body)",
+        f"INSERT INTO {fts} (rowid, doctor_key, body) "
+        f"SELECT rowid, 'd' || doctor_id, {text} FROM {table} WHERE {text} IS NOT NULL",
+        f"""CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} WHEN new.{text} IS NOT NULL BEGIN
+            INSERT INTO {fts} (rowid, doctor_key, body) VALUES (new.rowid, {values.format(row='new')});
+        END""",
+        f"""CREATE TRIGGER {fts}_update AFTER UPDATE OF doctor_id, {text} ON {table} BEGIN
+            DELETE FROM {fts} WHERE rowid = old.rowid;
+            INSERT INTO {fts} (rowid, doctor_key, body)
+                SELECT new.rowid, {values.format(row='new')} WHERE new.{text} IS NOT NULL;
+        END""",
+        f"""CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN
+            DELETE FROM {fts} WHERE rowid = old.rowid;
+        END""",
+    ]
+
+
+SQLITE_CREATE = [
+    *_sqlite_statements('doctor_notes', 'doctor_notes_search', 'note_text'),
+    *_sqlite_statements('saved_patients', 'saved_patients_search', 'consultation_notes'),
+]
+
+SQLITE_DROP = [
+    f"DROP {kind} IF EXISTS {name}"
+    for fts in ('doctor_notes_search', 'saved_patients_search')
+    for kind, name in (
+        ('TRIGGER', f'{fts}_insert'),
+        ('TRIGGER', f'{fts}_update'),
+        ('TRIGGER', f'{fts}_delete'),
+        ('TABLE', fts),
+    )
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = POSTGRESQL_CREATE
+    elif vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                # sharing.search falls back to icontains
+                return
+        statements = SQLITE_CREATE
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'postgresql': POSTGRESQL_DROP, 'sqlite': SQLITE_DROP}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sharing', '0004_accesslog_doctor_patient_index'),
+    ]
+    
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:30
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_updated_at(apps, schema_editor):
+    """Last known change instead of the migration time"""
+    ShareToken = apps.get_model('sharing', 'ShareToken')
+    AccessLog = apps.get_model('sharing', 'AccessLog')
+    ShareToken.objects.update(updated_at=Coalesce('revoked_at', 'created_at'))
+    AccessLog.objects.update(updated_at=Coalesce('last_activity_at', 'accessed_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sharing', '0005_notes_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accesslog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='sharetoken',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=32)),
+                ('object_id', models.UUIDField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_tombstones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'sync_tombstones',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='sharetoken',
+            index=models.Index(fields=['patient', 'updated_at'], name='share_token_patient_993801_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accesslog',
+            index=models.Index(fields=['doctor', 'updated_at'], name='access_logs_doctor__8858bf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedpatient',
+            index=models.Index(fields=['doctor', 'updated_at'], name='saved_patie_doctor__1e27ea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctornote',
+            index=models.Index(fields=['doctor', 'updated_at'], name='doctor_note_doctor__17ca44_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['user', 'deleted_at'], name='sync_tombst_user_id_019028_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['deleted_at'], name='sync_tombst_deleted_f39b14_idx'),
+        ),
+    ]
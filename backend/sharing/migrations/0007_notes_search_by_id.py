@@ -0,0 +1,74 @@
+import importlib
+
+from django.db import migrations
+
+# SQLite may renumber the implicit rowid of UUID-keyed tables (VACUUM, table
+# rebuilds), so the FTS rows now carry the source row's id. Statements as of
+# this migration; sharing.search.ensure_sqlite_search_tables recreates the
+# triggers if a later table rebuild drops them.
+
+
+def _sqlite_statements(table, fts, key, text):
+    """FTS5 table keyed by the source row's id, with the doctor id indexed as a 'd<hex>' token"""
+    values = f"new.id, 'd' || new.doctor_id, new.{text}"
+    delete = f"""DELETE FROM {fts} WHERE {fts} MATCH '{key} : "' || old.id || '"';"""
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({key}, doctor_key, body)",
+        f"INSERT INTO {fts} ({key}, doctor_key, body) "
+        f"SELECT id, 'd' || doctor_id, {text} FROM {table} WHERE {text} IS NOT NULL",
+        f"""CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} WHEN new.{text} IS NOT NULL BEGIN
+            INSERT INTO {fts} ({key}, doctor_key, body) VALUES ({values});
+        END""",
+        f"""CREATE TRIGGER {fts}_update AFTER UPDATE OF doctor_id, {text} ON {table} BEGIN
+            {delete}
+            INSERT INTO {fts} ({key}, doctor_key, body) SELECT {values} WHERE new.{text} IS NOT NULL;
+        END""",
+        f"""CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN
+            {delete}
+        END""",
+    ]
+
+
+SQLITE_CREATE = [
+    *_sqlite_statements('doctor_notes', 'doctor_notes_search', 'note_id', 'note_text'),
+    *_sqlite_statements('saved_patients', 'saved_patients_search', 'saved_patient_id', 'consultation_notes'),
+]
+
+
+def _previous():
+    return importlib.import_module('sharing.migrations.0005_notes_search')
+
+
+def _has_search_tables(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'doctor_notes_search'"
+        )
+        return cursor.fetchone() is not None
+
+
+def key_by_id(apps, schema_editor):
+    # Without FTS5, 0005 created nothing and sharing.search falls back to icontains
+    if schema_editor.connection.vendor != 'sqlite' or not _has_search_tables(schema_editor):
+        return
+    for statement in _previous().SQLITE_DROP + SQLITE_CREATE:
+        schema_editor.execute(statement)
+
+
+def key_by_rowid(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite' or not _has_search_tables(schema_editor):
+        return
+    previous = _previous()
+    for statement in previous.SQLITE_DROP + previous.SQLITE_CREATE:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sharing', '0006_sync'),
+    ]
+    
+    operations = [
+        migrations.RunPython(key_by_id, key_by_rowid),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:44
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def backfill_sync_updated_at(apps, schema_editor):
+    """Keep sync cursors issued against updated_at valid"""
+    for name in ('SavedPatient', 'DoctorNote'):
+        apps.get_model('sharing', name).objects.update(sync_updated_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sharing', '0007_notes_search_by_id'),
+    ]
+    
+    operations = [
+        migrations.RemoveIndex(
+            model_name='doctornote',
+            name='doctor_note_doctor__17ca44_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='savedpatient',
+            name='saved_patie_doctor__1e27ea_idx',
+        ),
+        migrations.AddField(
+            model_name='doctornote',
+            name='sync_updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='savedpatient',
+            name='sync_updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_sync_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='doctornote',
+            index=models.Index(fields=['doctor', 'sync_updated_at'], name='doctor_note_doctor__2f2710_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedpatient',
+            index=models.Index(fields=['doctor', 'sync_updated_at'], name='saved_patie_doctor__01d824_idx'),
+        ),
+    ]
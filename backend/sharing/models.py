@@ -3,6 +3,7 @@ from django.conf import settings
 import uuid
 from datetime import timedelta
 from django.utils import timezone
+from .cache import invalidate_token_payload
 
 
 class ShareToken(models.Model):
@@ -38,6 +39,7 @@ class ShareToken(models.Model):
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     revoked_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'share_tokens'
@@ -45,17 +47,20 @@ class ShareToken(models.Model):
         indexes = [
             models.Index(fields=['patient', 'is_revoked']),
             models.Index(fields=['expires_at']),
+            models.Index(fields=['patient', 'updated_at']),
         ]
     
     def __str__(self):
         return f"Share token for {self.patient.full_name} - {self.share_method}"
     
-    def is_valid(self):
-        """Check if token is still valid"""
+    def is_valid(self, ignore_access_limit=False):
+        """Check if token is still valid (open doctor sessions ignore the access limit)"""
         if self.is_revoked:
             return False
         if timezone.now() > self.expires_at:
             return False
+        if ignore_access_limit:
+            return True
         if self.max_access_count and self.current_access_count >= self.max_access_count:
             return False
         return True
@@ -63,13 +68,16 @@ class ShareToken(models.Model):
     def increment_access(self):
         """Increment access count"""
         self.current_access_count += 1
-        self.save(update_fields=['current_access_count'])
+        self.save(update_fields=['current_access_count', 'updated_at'])
+        if self.max_access_count and self.current_access_count >= self.max_access_count:
+            invalidate_token_payload(self.pk)
     
     def revoke(self):
         """Revoke the share token"""
         self.is_revoked = True
         self.revoked_at = timezone.now()
         self.save()
+        invalidate_token_payload(self.pk)
 
 
 class AccessLog(models.Model):
@@ -99,8 +107,11 @@ class AccessLog(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(null=True, blank=True)
     
-    # Timestamp
+    # Timestamps (a log row covers a whole doctor access session)
     accessed_at = models.DateTimeField(auto_now_add=True)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    request_count = models.IntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'access_logs'
@@ -108,10 +119,19 @@ class AccessLog(models.Model):
         indexes = [
             models.Index(fields=['doctor', 'accessed_at']),
             models.Index(fields=['patient', 'accessed_at']),
+            models.Index(fields=['doctor', 'patient', 'accessed_at']),
+            models.Index(fields=['doctor', 'updated_at']),
         ]
     
     def __str__(self):
         return f"Access by {self.doctor.full_name} to {self.patient.full_name} - {self.accessed_at}"
+    
+    @property
+    def session_duration(self):
+        """Time between opening the session and its last request"""
+        if not self.last_activity_at:
+            return timedelta(0)
+        return self.last_activity_at - self.accessed_at
 
 
 class SavedPatient(models.Model):
@@ -138,6 +158,8 @@ class SavedPatient(models.Model):
     # Timestamps
     saved_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Read by incremental sync; also bumped when the embedded profile changes
+    sync_updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'saved_patients'
@@ -145,6 +167,7 @@ class SavedPatient(models.Model):
         ordering = ['-updated_at']
         indexes = [
             models.Index(fields=['doctor', 'saved_at']),
+            models.Index(fields=['doctor', 'sync_updated_at']),
         ]
     
     def __str__(self):
@@ -176,14 +199,39 @@ class DoctorNote(models.Model):
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Read by incremental sync; also bumped when the embedded profiles change
+    sync_updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'doctor_notes'
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['doctor', 'patient', 'created_at']),
+            models.Index(fields=['doctor', 'sync_updated_at']),
         ]
     
     def __str__(self):
         return f"Note by {self.doctor.full_name} for {self.patient.full_name}"
 
+
+class SyncTombstone(models.Model):
+    """Deleted row, kept so sync clients can drop their copy (see sharing.sync)"""
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='sync_tombstones'
+    )
+    model = models.CharField(max_length=32)  # sharing.sync.SYNC_MODELS key
+    object_id = models.UUIDField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'sync_tombstones'
+        indexes = [
+            models.Index(fields=['user', 'deleted_at']),
+            models.Index(fields=['deleted_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted at {self.deleted_at}"
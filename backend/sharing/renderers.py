@@ -0,0 +1,83 @@
+"""
+orjson-backed JSON renderer and parser for the REST API.
+
+Enable through REST_FRAMEWORK in settings:
+
+    'DEFAULT_RENDERER_CLASSES': ['sharing.renderers.FastJSONRenderer', ...],
+    'DEFAULT_PARSER_CLASSES': ['sharing.renderers.FastJSONParser', ...],
+
+orjson encodes UUIDs, dates and datetimes natively; anything else (Decimal,
+timedelta, lazy strings, querysets...) goes through DRF's own JSONEncoder, so
+the output matches DRF's JSONRenderer. Both classes fall back to the stdlib
+implementation when orjson is not installed, when API_JSON_BACKEND is set to
+'json', or for cases orjson cannot reproduce (indented output, non-UTF-8
+bodies, ensure_ascii, integers wider than 64 bits).
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+ORJSON_OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+_LINE_SEPARATOR = b'\xe2\x80\xa8'
+_PARAGRAPH_SEPARATOR = b'\xe2\x80\xa9'
+
+_default = JSONEncoder().default
+
+
+def use_orjson():
+    """Whether the fast path is available and enabled (API_JSON_BACKEND)"""
+    return orjson is not None and getattr(settings, 'API_JSON_BACKEND', 'orjson') == 'orjson'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer producing the same bytes via orjson"""
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        
+        renderer_context = renderer_context or {}
+        if (
+            not use_orjson()
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        
+        try:
+            ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        
+        # Same as JSONRenderer: keep the output valid inside <script> blocks
+        if _LINE_SEPARATOR in ret:
+            ret = ret.replace(_LINE_SEPARATOR, b'\\u2028')
+        if _PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(_PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser decoding UTF-8 request bodies with orjson"""
+    renderer_class = FastJSONRenderer
+    
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if not use_orjson() or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,293 @@
+"""
+Doctor-scoped full-text search over DoctorNote.note_text and
+SavedPatient.consultation_notes.
+
+The indexes are created by migrations sharing 0005/0007 and kept current by the
+database itself, so every save is indexed incrementally:
+
+- PostgreSQL: GIN indexes on (doctor_id, to_tsvector('simple', text)) via
+  btree_gin, so the doctor scope and the words are one index lookup.
+- SQLite: FTS5 tables ``doctor_notes_search`` / ``saved_patients_search``
+  holding the source row's id (an indexed token, so triggers delete by
+  MATCH), the doctor id as a ``d<hex>`` token and the text, maintained by
+  triggers. A page is chosen on (timestamp, id) before snippets are built.
+  A table rebuild on SQLite drops the triggers; ensure_sqlite_search_tables
+  (run after every migrate) recreates them and reindexes.
+- other databases (or SQLite without FTS5): ``icontains`` per word.
+
+Every word matches as a prefix. Results are newest first (note created_at,
+consultation notes updated_at) and paginated by an opaque keyset cursor over
+(timestamp, id). Snippets are HTML-escaped with matches wrapped in <mark>;
+they are built only for the returned page.
+"""
+import base64
+import html
+import json
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.utils import timezone
+
+from users.search import WORD_RE
+from .models import DoctorNote, SavedPatient
+
+SNIPPET_WORDS = 16
+
+# Highlight markers the database places around matches; the text is escaped
+# before they become <mark> tags
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+_fts5_available = None
+
+SOURCES = {
+    'note': {
+        'table': 'doctor_notes',
+        'fts': 'doctor_notes_search',
+        'key': 'note_id',
+        'text': 'note_text',
+        'timestamp': 'created_at',
+    },
+    'consultation': {
+        'table': 'saved_patients',
+        'fts': 'saved_patients_search',
+        'key': 'saved_patient_id',
+        'text': 'consultation_notes',
+        'timestamp': 'updated_at',
+    },
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, object_id):
+    payload = json.dumps([timestamp.isoformat(), str(object_id)]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, object_id = json.loads(payload)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Invalid cursor.') from e
+    if not isinstance(timestamp, str) or not isinstance(object_id, str):
+        raise InvalidCursor('Invalid cursor.')
+    return timestamp, object_id
+
+
+def _has_fts5():
+    global _fts5_available
+    if _fts5_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'doctor_notes_search'"
+            )
+            _fts5_available = cursor.fetchone() is not None
+    return _fts5_available
+
+
+def _sqlite_triggers(source):
+    table, fts, key, text = source['table'], source['fts'], source['key'], source['text']
+    values = f"new.id, 'd' || new.doctor_id, new.{text}"
+    delete = f"""DELETE FROM {fts} WHERE {fts} MATCH '{key} : "' || old.id || '"';"""
+    return {
+        f'{fts}_insert': f"""CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table}
+            WHEN new.{text} IS NOT NULL BEGIN
+            INSERT INTO {fts} ({key}, doctor_key, body) VALUES ({values});
+        END""",
+        f'{fts}_update': f"""CREATE TRIGGER IF NOT EXISTS {fts}_update
+            AFTER UPDATE OF doctor_id, {text} ON {table} BEGIN
+            {delete}
+            INSERT INTO {fts} ({key}, doctor_key, body) SELECT {values} WHERE new.{text} IS NOT NULL;
+        END""",
+        f'{fts}_delete': f"""CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+            {delete}
+        END""",
+    }
+
+
+def ensure_sqlite_search_tables(using=None, **kwargs):
+    """
+    post_migrate: recreate triggers dropped by a SQLite table rebuild (e.g. an
+    AlterField) and reindex the affected table. No-op without the FTS tables.
+    """
+    db = connections[using or DEFAULT_DB_ALIAS]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {name for _, name in cursor.fetchall()}
+        for source in SOURCES.values():
+            triggers = _sqlite_triggers(source)
+            if source['fts'] not in existing or existing.issuperset(triggers):
+                continue
+            for statement in triggers.values():
+                cursor.execute(statement)
+            cursor.execute(f"DELETE FROM {source['fts']}")
+            cursor.execute(
+                f"INSERT INTO {source['fts']} ({source['key']}, doctor_key, body) "
+                f"SELECT id, 'd' || doctor_id, {source['text']} FROM {source['table']} "
+                f"WHERE {source['text']} IS NOT NULL"
+            )
+
+
+def _doctor_key(doctor_id):
+    return f'd{uuid.UUID(str(doctor_id)).hex}'
+
+
+def _render_snippet(marked):
+    escaped = html.escape(marked or '')
+    return escaped.replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def _python_snippet(text, words):
+    """Marked window of SNIPPET_WORDS around the first matching word"""
+    tokens = (text or '').split()
+    first = next(
+        (i for i, token in enumerate(tokens) if any(word in token.lower() for word in words)), 0
+    )
+    start = max(0, first - SNIPPET_WORDS // 4)
+    window = tokens[start:start + SNIPPET_WORDS]
+    marked = [
+        f'{_MARK_START}{token}{_MARK_END}'
+        if any(word in token.lower() for word in words) else token
+        for token in window
+    ]
+    prefix = '… ' if start > 0 else ''
+    suffix = ' …' if start + SNIPPET_WORDS < len(tokens) else ''
+    return prefix + ' '.join(marked) + suffix
+
+
+def _as_datetime(value):
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    return timezone.make_aware(value, dt_timezone.utc) if timezone.is_naive(value) else value
+
+
+def _fetch(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _search_sqlite(doctor_id, words, after, limit):
+    match = f'doctor_key : "{_doctor_key(doctor_id)}" AND body : (' + ' AND '.join(
+        f'"{word}"*' for word in words
+    ) + ')'
+    rows = []
+    for kind, source in SOURCES.items():
+        fts, timestamp = source['fts'], source['timestamp']
+        where, params = f"{fts} MATCH %s", [match]
+        if after:
+            # Compared with the stored text representation
+            where += f" AND (t.{timestamp}, t.id) < (%s, %s)"
+            params.extend([connection.ops.adapt_datetimefield_value(after[0]), after[1].hex])
+        # The page is picked first, so snippets are built for ``limit`` rows
+        # only; the FTS rowid joins back within this one statement
+        rows.extend(_fetch(
+            f"WITH page AS (SELECT t.id, t.patient_id, t.{timestamp} AS ts, {fts}.rowid AS fts_rowid "
+            f"FROM {fts} JOIN {source['table']} t ON t.id = {fts}.{source['key']} "
+            f"WHERE {where} ORDER BY t.{timestamp} DESC, t.id DESC LIMIT %s) "
+            f"SELECT '{kind}', page.id, page.patient_id, page.ts, "
+            f"snippet({fts}, 2, %s, %s, '…', {SNIPPET_WORDS}) "
+            f"FROM {fts} CROSS JOIN page ON page.fts_rowid = {fts}.rowid WHERE {fts} MATCH %s "
+            f"AND {fts}.rowid BETWEEN (SELECT min(fts_rowid) FROM page) AND (SELECT max(fts_rowid) FROM page)",
+            [*params, limit, _MARK_START, _MARK_END, match],
+        ))
+    rows.sort(key=lambda row: (_as_datetime(row[3]), row[1]), reverse=True)
+    return rows[:limit]
+
+
+def _search_postgresql(doctor_id, words, after, limit):
+    tsquery = ' & '.join(f'{word}:*' for word in words)
+    branches, params = [], []
+    for kind, source in SOURCES.items():
+        # Expressions match the GIN indexes created by the migration
+        where = (
+            f"t.doctor_id = %s AND to_tsvector('simple', coalesce(t.{source['text']}, '')) "
+            f"@@ to_tsquery('simple', %s)"
+        )
+        params.extend([doctor_id, tsquery])
+        if after:
+            where += f" AND (t.{source['timestamp']}, t.id) < (%s, %s)"
+            params.extend(after)
+        branches.append(
+            f"(SELECT '{kind}' AS kind, t.id, t.patient_id, t.{source['timestamp']} AS ts, "
+            f"t.{source['text']} AS body FROM {source['table']} t WHERE {where} "
+            f"ORDER BY ts DESC, t.id DESC LIMIT %s)"
+        )
+        params.append(limit)
+    options = f'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords={SNIPPET_WORDS}, MinWords=5'
+    return _fetch(
+        "SELECT kind, id, patient_id, ts, ts_headline('simple', body, to_tsquery('simple', %s), %s) "
+        "FROM (SELECT * FROM (" + ' UNION ALL '.join(branches) + ") u "
+        "ORDER BY ts DESC, id DESC LIMIT %s) page ORDER BY ts DESC, id DESC",
+        [tsquery, options, *params, limit],
+    )
+
+
+def _search_fallback(doctor_id, words, after, limit):
+    rows = []
+    for kind, model in (('note', DoctorNote), ('consultation', SavedPatient)):
+        source = SOURCES[kind]
+        queryset = model.objects.filter(doctor_id=doctor_id)
+        for word in words:
+            queryset = queryset.filter(**{f"{source['text']}__icontains": word})
+        if after:
+            timestamp, object_id = after
+            queryset = queryset.filter(**{f"{source['timestamp']}__lt": timestamp}) | queryset.filter(
+                **{source['timestamp']: timestamp, 'id__lt': object_id}
+            )
+        for object_id, patient_id, ts, text in queryset.order_by(
+            f"-{source['timestamp']}", '-id'
+        ).values_list('id', 'patient_id', source['timestamp'], source['text'])[:limit]:
+            rows.append((kind, object_id, patient_id, ts, _python_snippet(text, words)))
+    rows.sort(key=lambda row: (row[3], str(row[1])), reverse=True)
+    return rows[:limit]
+
+
+def search_notes(doctor, query, cursor=None, limit=20):
+    """
+    Search the doctor's notes and consultation notes.
+    Returns (hits, next_cursor); each hit is a dict with type, id, patient_id,
+    timestamp and snippet. Raises InvalidCursor for a malformed cursor.
+    """
+    # Accents are kept: FTS5 folds them itself, tsvector 'simple' does not
+    words = WORD_RE.findall((query or '').lower())
+    if not words:
+        return [], None
+    after = None
+    if cursor:
+        timestamp, object_id = decode_cursor(cursor)
+        try:
+            timestamp, object_id = _as_datetime(timestamp), uuid.UUID(object_id)
+        except ValueError as e:
+            raise InvalidCursor('Invalid cursor.') from e
+        after = (timestamp, object_id)
+    
+    if connection.vendor == 'postgresql':
+        rows = _search_postgresql(doctor.pk, words, after, limit + 1)
+    elif connection.vendor == 'sqlite' and _has_fts5():
+        rows = _search_sqlite(doctor.pk, words, after, limit + 1)
+    else:
+        rows = _search_fallback(doctor.pk, words, after, limit + 1)
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(_as_datetime(rows[-1][3]), uuid.UUID(str(rows[-1][1])))
+    hits = [
+        {
+            'type': kind,
+            'id': uuid.UUID(str(object_id)),
+            'patient_id': uuid.UUID(str(patient_id)),
+            'timestamp': _as_datetime(ts),
+            'snippet': _render_snippet(snippet),
+        }
+        for kind, object_id, patient_id, ts, snippet in rows
+    ]
+    return hits, next_cursor
@@ -1,15 +1,18 @@
 from rest_framework import serializers
 from .models import ShareToken, AccessLog, SavedPatient, DoctorNote
+from records.models import MedicalRecord
 from records.serializers import MedicalRecordListSerializer
-from users.serializers import UserProfileSerializer
+from users.serializers import UserProfileField
 from django.conf import settings
+from django.urls import reverse
 from datetime import timedelta
 from django.utils import timezone
+from urllib.parse import urlencode
 
 
 class ShareTokenSerializer(serializers.ModelSerializer):
     """Serializer for share tokens"""
-    patient_info = UserProfileSerializer(source='patient', read_only=True)
+    patient_info = UserProfileField(source='patient')
     records_info = MedicalRecordListSerializer(source='records', many=True, read_only=True)
     qr_code_data = serializers.SerializerMethodField()
     share_url = serializers.SerializerMethodField()
@@ -45,6 +48,39 @@ class ShareTokenSerializer(serializers.ModelSerializer):
         return obj.is_valid()
 
 
+def shared_record_url(request, url_name, token_id, record_id, session=None):
+    """URL of a shared record endpoint, carrying the access session handle"""
+    path = reverse(url_name, kwargs={'token_id': token_id, 'record_id': record_id})
+    if session:
+        path += '?' + urlencode({'session': session})
+    return request.build_absolute_uri(path) if request else path
+
+
+class SharedRecordManifestSerializer(serializers.ModelSerializer):
+    """Compact entry for a record in a shared-records manifest"""
+    detail_url = serializers.SerializerMethodField()
+    file_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = MedicalRecord
+        fields = (
+            'id', 'file_name', 'file_type', 'file_size', 'document_type',
+            'date_of_record', 'detail_url', 'file_url'
+        )
+    
+    def _record_url(self, obj, url_name):
+        return shared_record_url(
+            self.context.get('request'), url_name, self.context['share_token'].id, obj.id,
+            self.context.get('session')
+        )
+    
+    def get_detail_url(self, obj):
+        return self._record_url(obj, 'shared-record-detail')
+    
+    def get_file_url(self, obj):
+        return self._record_url(obj, 'shared-record-file')
+
+
 class CreateShareTokenSerializer(serializers.Serializer):
     """Serializer for creating share tokens"""
     record_ids = serializers.ListField(
@@ -87,23 +123,24 @@ class CreateShareTokenSerializer(serializers.Serializer):
 
 class AccessLogSerializer(serializers.ModelSerializer):
     """Serializer for access logs"""
-    doctor_info = UserProfileSerializer(source='doctor', read_only=True)
-    patient_info = UserProfileSerializer(source='patient', read_only=True)
+    doctor_info = UserProfileField(source='doctor')
+    patient_info = UserProfileField(source='patient')
     records_info = MedicalRecordListSerializer(source='accessed_records', many=True, read_only=True)
+    session_duration = serializers.DurationField(read_only=True)
     
     class Meta:
         model = AccessLog
         fields = (
             'id', 'doctor', 'doctor_info', 'patient', 'patient_info',
             'accessed_records', 'records_info', 'ip_address', 'user_agent',
-            'accessed_at'
+            'accessed_at', 'last_activity_at', 'request_count', 'session_duration'
         )
         read_only_fields = ('id', 'accessed_at')
 
 
 class SavedPatientSerializer(serializers.ModelSerializer):
     """Serializer for saved patients"""
-    patient_info = UserProfileSerializer(source='patient', read_only=True)
+    patient_info = UserProfileField(source='patient')
     
     class Meta:
         model = SavedPatient
@@ -114,10 +151,33 @@ class SavedPatientSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'saved_at', 'updated_at')
 
 
+class SavedPatientPanelSerializer(serializers.ModelSerializer):
+    """Doctor home-screen row: slim patient fields plus activity summaries"""
+    patient_uuid = serializers.UUIDField(source='patient.patient_uuid', read_only=True)
+    patient_name = serializers.CharField(source='patient.full_name', read_only=True)
+    gender = serializers.CharField(source='patient.gender', read_only=True)
+    date_of_birth = serializers.DateField(source='patient.date_of_birth', read_only=True)
+    blood_group = serializers.CharField(source='patient.blood_group', read_only=True)
+    last_accessed_at = serializers.DateTimeField(read_only=True)
+    note_count = serializers.IntegerField(read_only=True)
+    latest_note_snippet = serializers.CharField(read_only=True)
+    latest_note_at = serializers.DateTimeField(read_only=True)
+    active_share_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = SavedPatient
+        fields = (
+            'id', 'patient', 'patient_uuid', 'patient_name', 'gender', 'date_of_birth',
+            'blood_group', 'last_consultation_date', 'saved_at', 'last_accessed_at',
+            'note_count', 'latest_note_snippet', 'latest_note_at', 'active_share_count'
+        )
+        read_only_fields = fields
+
+
 class DoctorNoteSerializer(serializers.ModelSerializer):
     """Serializer for doctor notes"""
-    doctor_info = UserProfileSerializer(source='doctor', read_only=True)
-    patient_info = UserProfileSerializer(source='patient', read_only=True)
+    doctor_info = UserProfileField(source='doctor')
+    patient_info = UserProfileField(source='patient')
     
     class Meta:
         model = DoctorNote
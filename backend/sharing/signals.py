@@ -0,0 +1,118 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Q, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from records.models import MedicalRecord
+from users.serializers import PROFILE_FIELDS
+from .models import AccessLog, DoctorNote, SavedPatient, ShareToken, SyncTombstone
+from .sync import SYNC_MODELS
+
+User = get_user_model()
+
+
+def _deleting_user(origin, user_id):
+    """Whether the delete that started at ``origin`` removes the user ``user_id``"""
+    if isinstance(origin, User):
+        return origin.pk == user_id
+    if isinstance(origin, QuerySet) and issubclass(origin.model, User):
+        # Evaluated once per delete(); the users are still there while
+        # their dependent rows' signals run
+        if not hasattr(origin, '_sync_deleted_user_ids'):
+            origin._sync_deleted_user_ids = set(origin.values_list('pk', flat=True))
+        return user_id in origin._sync_deleted_user_ids
+    return False
+
+
+def _record_tombstone(sender, instance, origin=None, **kwargs):
+    """Let sync clients drop deleted rows (not when the owner is being deleted too)"""
+    key, owner = _SYNC_OWNERS[sender]
+    owner_id = getattr(instance, f'{owner}_id')
+    if _deleting_user(origin, owner_id):
+        return
+    SyncTombstone.objects.create(user_id=owner_id, model=key, object_id=instance.pk)
+
+
+_SYNC_OWNERS = {model: (key, owner) for key, (model, owner, *_) in SYNC_MODELS.items()}
+_SYNC_TIMESTAMPS = {model: timestamp for model, _, timestamp, *_ in SYNC_MODELS.values()}
+
+for _model, (_key, _) in _SYNC_OWNERS.items():
+    post_delete.connect(_record_tombstone, sender=_model, dispatch_uid=f'sync-tombstone-{_key}')
+
+
+# User foreign keys whose profile the sync serializers embed (*_info fields)
+_EMBEDDED_PROFILES = {
+    ShareToken: ('patient',),
+    SavedPatient: ('patient',),
+    DoctorNote: ('doctor', 'patient'),
+    AccessLog: ('doctor', 'patient'),
+}
+
+
+# Embedded profile values; the timestamps change on every save (password
+# changes, activation) without the profile changing
+_SYNCED_PROFILE_FIELDS = tuple(
+    field for field in PROFILE_FIELDS if field not in ('id', 'created_at', 'updated_at')
+)
+
+
+@receiver(pre_save, sender=User)
+def snapshot_profile(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Compare the profile values being saved with the stored ones"""
+    instance._sync_profile_changed = False
+    if raw or instance._state.adding:
+        return
+    deferred = instance.get_deferred_fields()
+    fields = [
+        field for field in _SYNCED_PROFILE_FIELDS
+        if field not in deferred and (update_fields is None or field in update_fields)
+    ]
+    if not fields:
+        return
+    stored = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._sync_profile_changed = stored is not None and any(
+        stored[field] != getattr(instance, field) for field in fields
+    )
+
+
+@receiver(post_save, sender=User)
+def touch_profile_rows(sender, instance, created, **kwargs):
+    """A profile change has to resend the synced rows that embed it"""
+    if created or not getattr(instance, '_sync_profile_changed', False):
+        return
+    instance._sync_profile_changed = False
+    now = timezone.now()
+    for model, fields in _EMBEDDED_PROFILES.items():
+        embedded = Q()
+        for field in fields:
+            embedded |= Q(**{field: instance})
+        model.objects.filter(embedded).update(**{_SYNC_TIMESTAMPS[model]: now})
+
+
+@receiver(m2m_changed, sender=AccessLog.accessed_records.through)
+def touch_access_log(sender, instance, action, pk_set, reverse, **kwargs):
+    """Opening a record changes the log's records list, which sync has to resend"""
+    if action == 'post_add' and pk_set and not reverse:
+        AccessLog.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+
+
+def _touch_record_rows(record):
+    """Tokens and access logs embed their records (records_info), which sync has to resend"""
+    now = timezone.now()
+    ShareToken.objects.filter(records=record).update(updated_at=now)
+    AccessLog.objects.filter(accessed_records=record).update(updated_at=now)
+
+
+@receiver(post_save, sender=MedicalRecord)
+def touch_record_rows_on_save(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        _touch_record_rows(instance)
+
+
+@receiver(pre_delete, sender=MedicalRecord)
+def touch_record_rows_on_delete(sender, instance, origin=None, **kwargs):
+    # Before the delete removes the m2m rows that find them; the patient's
+    # tokens go too when the patient is being deleted
+    if not _deleting_user(origin, instance.patient_id):
+        _touch_record_rows(instance)
@@ -0,0 +1,179 @@
+"""
+Incremental sync for the mobile app.
+
+GET /api/sharing/sync/ without a cursor returns every row the user can list
+(patients: share tokens; doctors: saved patients, notes and access logs);
+with the returned cursor it returns only rows created or updated since, plus
+the ids of rows deleted since (SyncTombstone rows written by sharing.signals).
+
+Each model is read in (timestamp, id) order from its (owner, timestamp)
+index, where the timestamp is updated_at for share tokens and access logs and
+sync_updated_at for saved patients and notes (whose updated_at is shown to
+doctors), at most SYNC_PAGE_SIZE rows per model per response; ``has_more``
+means the client should call again with the new cursor straight away. Rows
+are read only up to SYNC_SETTLE_SECONDS before now, so a transaction that
+commits a slightly older timestamp is still picked up by the next call.
+
+Rows embed user profiles and medical records, so sharing.signals bumps the
+timestamp on every row that embeds a user whose profile values change or a
+record that is saved. A share token's is_valid also flips without a write when
+it expires, so tokens whose expires_at passed since the previous call are
+resent as well.
+
+Cursors are signed and bound to the user. Tombstones are kept for
+SYNC_TOMBSTONE_RETENTION_DAYS (``prune_sync_tombstones``); an older cursor is
+rejected and the client starts over without one.
+"""
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AccessLog, DoctorNote, SavedPatient, ShareToken, SyncTombstone
+from .serializers import (
+    AccessLogSerializer, DoctorNoteSerializer, SavedPatientSerializer, ShareTokenSerializer
+)
+
+CURSOR_SALT = 'sharing.sync'
+
+# Positions after every row with the same timestamp
+_MAX_UUID = str(uuid.UUID(int=(1 << 128) - 1))
+_MAX_ID = (1 << 63) - 1
+
+# key -> (model, owner field, timestamp field, owner role, serializer, queryset options)
+SYNC_MODELS = {
+    'share_tokens': (
+        ShareToken, 'patient', 'updated_at', 'PATIENT', ShareTokenSerializer,
+        lambda qs: qs.select_related('patient').prefetch_related('records'),
+    ),
+    'saved_patients': (
+        SavedPatient, 'doctor', 'sync_updated_at', 'DOCTOR', SavedPatientSerializer,
+        lambda qs: qs.select_related('patient'),
+    ),
+    'notes': (
+        DoctorNote, 'doctor', 'sync_updated_at', 'DOCTOR', DoctorNoteSerializer,
+        lambda qs: qs.select_related('doctor', 'patient'),
+    ),
+    'access_logs': (
+        AccessLog, 'doctor', 'updated_at', 'DOCTOR', AccessLogSerializer,
+        lambda qs: qs.select_related('doctor', 'patient').prefetch_related('accessed_records'),
+    ),
+}
+
+# key -> field whose passing changes the serialized row without a write
+_EXPIRY_FIELDS = {
+    'share_tokens': 'expires_at',
+}
+
+
+class InvalidSyncCursor(Exception):
+    """Malformed, foreign or expired cursor: the client must sync from scratch"""
+
+
+def sync_keys_for(user):
+    return [key for key, (_, _, _, role, _, _) in SYNC_MODELS.items() if user.role == role]
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def _dump_position(timestamp, object_id):
+    return [timestamp.isoformat(), str(object_id)]
+
+
+def _load_position(position):
+    timestamp, object_id = position
+    return datetime.fromisoformat(timestamp), object_id
+
+
+def encode_cursor(user, positions, tombstones, upto):
+    return signing.dumps({
+        'u': str(user.pk),
+        'p': {key: _dump_position(*position) for key, position in positions.items()},
+        't': _dump_position(*tombstones),
+        'x': upto.isoformat(),
+    }, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(user, cursor):
+    """(positions per model key, tombstone position, upto of the call that issued it)"""
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+        if data['u'] != str(user.pk):
+            raise InvalidSyncCursor('Sync cursor belongs to another user.')
+        positions = {key: _load_position(value) for key, value in data['p'].items()}
+        tombstones = _load_position(data['t'])
+        # Cursors issued before 'x' existed: the tombstone position is close enough
+        since = datetime.fromisoformat(data['x']) if 'x' in data else tombstones[0]
+    except (signing.BadSignature, KeyError, TypeError, ValueError) as e:
+        raise InvalidSyncCursor('Invalid sync cursor.') from e
+    if tombstones[0] < timezone.now() - tombstone_retention():
+        raise InvalidSyncCursor('Sync cursor has expired; sync again without a cursor.')
+    return positions, tombstones, since
+
+
+def _after(queryset, field, position):
+    timestamp, object_id = position
+    return queryset.filter(Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'pk__gt': object_id}))
+
+
+def sync_changes(user, cursor=None, request=None):
+    """
+    Changes for ``user`` since ``cursor`` (None for a full snapshot).
+    Raises InvalidSyncCursor.
+    """
+    page_size = getattr(settings, 'SYNC_PAGE_SIZE', 500)
+    upto = timezone.now() - timedelta(seconds=getattr(settings, 'SYNC_SETTLE_SECONDS', 2))
+    keys = sync_keys_for(user)
+    
+    if cursor:
+        positions, tombstone_position, since = decode_cursor(user, cursor)
+    else:
+        # Rows deleted before the snapshot are simply absent from it
+        positions, tombstone_position, since = {}, (upto, _MAX_ID), None
+    
+    changes, deleted, has_more = {}, {key: [] for key in keys}, False
+    for key in keys:
+        model, owner, timestamp, _, serializer_class, options = SYNC_MODELS[key]
+        queryset = model.objects.filter(**{owner: user, f'{timestamp}__lte': upto})
+        if key in positions:
+            queryset = _after(queryset, timestamp, positions[key])
+        rows = list(options(queryset).order_by(timestamp, 'pk')[:page_size + 1])
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            positions[key] = (getattr(rows[-1], timestamp), rows[-1].pk)
+            has_more = True
+        else:
+            positions[key] = (upto, _MAX_UUID)
+        expiry = _EXPIRY_FIELDS.get(key)
+        if expiry and since is not None:
+            expired = model.objects.filter(
+                **{owner: user, f'{expiry}__gt': since, f'{expiry}__lte': upto}
+            ).exclude(pk__in=[row.pk for row in rows])
+            rows += options(expired).order_by(expiry, 'pk')
+        changes[key] = serializer_class(rows, many=True, context={'request': request}).data
+    
+    tombstones = _after(
+        SyncTombstone.objects.filter(user=user, model__in=keys, deleted_at__lte=upto),
+        'deleted_at', tombstone_position,
+    ).order_by('deleted_at', 'pk').values_list('pk', 'model', 'object_id', 'deleted_at')
+    tombstones = list(tombstones[:page_size + 1])
+    if len(tombstones) > page_size:
+        tombstones = tombstones[:page_size]
+        tombstone_position = (tombstones[-1][3], tombstones[-1][0])
+        has_more = True
+    else:
+        tombstone_position = (upto, _MAX_ID)
+    for _, key, object_id, _ in tombstones:
+        deleted[key].append(object_id)
+    
+    return {
+        'changes': changes,
+        'deleted': deleted,
+        'cursor': encode_cursor(user, positions, tombstone_position, upto),
+        'has_more': has_more,
+    }
@@ -1,8 +1,10 @@
 from django.urls import path
 from .views import (
     ShareTokenListCreateView, ShareTokenDetailView, get_qr_code_image,
-    scan_qr_code, access_via_url, SavedPatientListCreateView, SavedPatientDetailView,
-    DoctorNoteListCreateView, DoctorNoteDetailView, AccessLogListView
+    scan_qr_code, access_via_url, shared_record_detail, shared_record_file,
+    SavedPatientListCreateView, SavedPatientPanelView, SavedPatientDetailView,
+    DoctorNoteListCreateView, DoctorNoteDetailView, search_notes_view, AccessLogListView,
+    sync_view, batch_view
 )
 
 urlpatterns = [
@@ -14,16 +16,26 @@ urlpatterns = [
     # QR code scanning
     path('scan/', scan_qr_code, name='scan-qr-code'),
     path('access/<uuid:token_id>/', access_via_url, name='access-via-url'),
+    path('access/<uuid:token_id>/records/<uuid:record_id>/', shared_record_detail, name='shared-record-detail'),
+    path('access/<uuid:token_id>/records/<uuid:record_id>/file/', shared_record_file, name='shared-record-file'),
     
     # Saved patients
     path('saved-patients/', SavedPatientListCreateView.as_view(), name='saved-patient-list-create'),
+    path('saved-patients/panel/', SavedPatientPanelView.as_view(), name='saved-patient-panel'),
     path('saved-patients/<uuid:pk>/', SavedPatientDetailView.as_view(), name='saved-patient-detail'),
     
     # Doctor notes
     path('notes/', DoctorNoteListCreateView.as_view(), name='doctor-note-list-create'),
+    path('notes/search/', search_notes_view, name='doctor-note-search'),
     path('notes/<uuid:pk>/', DoctorNoteDetailView.as_view(), name='doctor-note-detail'),
     
     # Access logs
     path('access-logs/', AccessLogListView.as_view(), name='access-log-list'),
+    
+    # Incremental sync
+    path('sync/', sync_view, name='sync'),
+    
+    # Batch reads
+    path('batch/', batch_view, name='batch'),
 ]
 
@@ -5,13 +5,20 @@ import json
 import base64
 from datetime import datetime, timedelta
 from django.conf import settings
-from cryptography.fernet import Fernet
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from cryptography.fernet import Fernet, MultiFernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import qrcode
 from io import BytesIO
 import os
+import threading
+from functools import lru_cache
 
 
 def generate_encryption_key():
@@ -19,34 +26,77 @@ def generate_encryption_key():
     return Fernet.generate_key()
 
 
-def encrypt_data(data, key=None):
-    """Encrypt data using Fernet (AES-256)"""
+def get_master_keys():
+    """
+    Return the configured master key ring, primary key first.
+    
+    ENCRYPTION_KEYS (a list, primary first) takes precedence over the single
+    ENCRYPTION_KEY; older keys in the ring are only used for decryption.
+    """
+    keys = getattr(settings, 'ENCRYPTION_KEYS', None) or [settings.ENCRYPTION_KEY]
+    keys = tuple(key.encode() if isinstance(key, str) else key for key in keys if key)
+    if not keys:
+        raise ImproperlyConfigured("ENCRYPTION_KEY (or ENCRYPTION_KEYS) must be set.")
+    return keys
+
+
+class CryptoContext:
+    """Fernet cipher bound to a key ring (MultiFernet when it holds old keys)"""
+    
+    def __init__(self, keys):
+        self.keys = keys
+        self.primary_key = keys[0]
+        fernets = [Fernet(key) for key in keys]
+        self.fernet = MultiFernet(fernets) if len(fernets) > 1 else fernets[0]
+    
+    def encrypt(self, data):
+        return self.fernet.encrypt(data)
+    
+    def decrypt(self, token):
+        return self.fernet.decrypt(token)
+    
+    def rotate(self, token):
+        """Re-encrypt a token under the primary key"""
+        if len(self.keys) == 1:
+            return self.fernet.encrypt(self.fernet.decrypt(token))
+        return self.fernet.rotate(token)
+
+
+@lru_cache(maxsize=256)
+def _build_crypto_context(keys):
+    return CryptoContext(keys)
+
+
+def get_crypto_context(key=None):
+    """
+    Return a cached CryptoContext for ``key`` (or the master key ring).
+    
+    Contexts are kept in a bounded LRU so per-record keys do not
+    accumulate, and constructing/validating Fernet keys happens once per key.
+    """
     if key is None:
-        key = settings.ENCRYPTION_KEY.encode() if settings.ENCRYPTION_KEY else generate_encryption_key()
+        keys = get_master_keys()
+    elif isinstance(key, (list, tuple)):
+        keys = tuple(k.encode() if isinstance(k, str) else k for k in key)
     else:
-        if isinstance(key, str):
-            key = key.encode()
-    
-    f = Fernet(key)
+        keys = (key.encode() if isinstance(key, str) else key,)
+    return _build_crypto_context(keys)
+
+
+def encrypt_data(data, key=None):
+    """Encrypt data using Fernet (AES-256)"""
     if isinstance(data, dict):
         data = json.dumps(data)
     if isinstance(data, str):
         data = data.encode()
     
-    encrypted = f.encrypt(data)
+    encrypted = get_crypto_context(key).encrypt(data)
     return encrypted.decode()
 
 
 def decrypt_data(encrypted_data, key=None):
-    """Decrypt data using Fernet"""
-    if key is None:
-        key = settings.ENCRYPTION_KEY.encode() if settings.ENCRYPTION_KEY else generate_encryption_key()
-    else:
-        if isinstance(key, str):
-            key = key.encode()
-    
-    f = Fernet(key)
-    decrypted = f.decrypt(encrypted_data.encode())
+    """Decrypt data using Fernet (any key in the ring)"""
+    decrypted = get_crypto_context(key).decrypt(encrypted_data.encode())
     return json.loads(decrypted.decode())
 
 
@@ -61,19 +111,50 @@ def generate_rsa_key_pair():
     return private_key, public_key
 
 
-def load_rsa_keys():
-    """Load RSA keys from file paths or generate new ones"""
-    if settings.RSA_PRIVATE_KEY_PATH and os.path.exists(settings.RSA_PRIVATE_KEY_PATH):
-        with open(settings.RSA_PRIVATE_KEY_PATH, 'rb') as f:
-            private_key = serialization.load_pem_private_key(
-                f.read(),
-                password=None,
-            )
-        public_key = private_key.public_key()
-    else:
-        private_key, public_key = generate_rsa_key_pair()
+# Loaded RSA keys, cached per process and keyed by the configured key path.
+# Parsing a PEM private key runs OpenSSL's consistency checks and costs far
+# more than a single decryption, so it must not happen on every call.
+_rsa_key_cache = {}
+_rsa_key_lock = threading.Lock()
+
+
+def load_rsa_keys(key_path=None):
+    """Load RSA keys from file paths or generate new ones (cached per process)"""
+    key_path = key_path or settings.RSA_PRIVATE_KEY_PATH or None
+    keys = _rsa_key_cache.get(key_path)
+    if keys is not None:
+        return keys
     
-    return private_key, public_key
+    with _rsa_key_lock:
+        keys = _rsa_key_cache.get(key_path)
+        if keys is None:
+            if key_path and os.path.exists(key_path):
+                with open(key_path, 'rb') as f:
+                    private_key = serialization.load_pem_private_key(
+                        f.read(),
+                        password=None,
+                    )
+                public_key = private_key.public_key()
+            else:
+                # No key configured: generate one for the lifetime of this
+                # process so that encrypt/decrypt at least agree with each other
+                private_key, public_key = generate_rsa_key_pair()
+            keys = (private_key, public_key)
+            _rsa_key_cache[key_path] = keys
+    
+    return keys
+
+
+def load_rsa_key_ring():
+    """
+    Private keys accepted for legacy tokens: the current key first, then
+    any retired keys listed in RSA_OLD_PRIVATE_KEY_PATHS (decrypt-only).
+    """
+    old_paths = [
+        path for path in getattr(settings, 'RSA_OLD_PRIVATE_KEY_PATHS', [])
+        if os.path.exists(path)
+    ]
+    return [load_rsa_keys()[0]] + [load_rsa_keys(path)[0] for path in old_paths]
 
 
 def encrypt_with_rsa(data, public_key=None):
@@ -194,6 +275,416 @@ def decrypt_with_rsa(encrypted_data, private_key=None):
                 raise ValueError(f"Failed to decrypt RSA data: {str(e)}")
 
 
+def decrypt_legacy_token(encrypted_data, private_key=None):
+    """Decrypt an RSA/hybrid token, trying every key in the RSA key ring"""
+    if private_key is not None:
+        return decrypt_with_rsa(encrypted_data, private_key)
+    
+    error = None
+    for private_key in load_rsa_key_ring():
+        try:
+            return decrypt_with_rsa(encrypted_data, private_key)
+        except ValueError as e:
+            error = e
+    raise error
+
+
+# Shared executor for batch crypto work, created lazily from settings
+_crypto_executor = None
+_crypto_executor_lock = threading.Lock()
+
+
+def _init_crypto_worker():
+    """Make sure Django is configured inside spawned crypto worker processes"""
+    import django
+    from django.apps import apps
+    
+    if not apps.ready:
+        django.setup()
+
+
+def create_crypto_executor(kind='thread', max_workers=None):
+    """
+    Create an executor for crypto batches.
+    
+    ``kind`` is 'thread' (OpenSSL releases the GIL, so threads scale for
+    RSA private-key operations), 'process' (isolates the Python glue as
+    well; workers load their own keys, so RSA_PRIVATE_KEY_PATH must be set)
+    or 'serial' / None to run inline.
+    """
+    if kind in (None, 'serial'):
+        return None
+    max_workers = max_workers or os.cpu_count() or 1
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='crypto')
+    if kind == 'process':
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=_init_crypto_worker)
+    raise ValueError(f"Unknown crypto executor kind: {kind}")
+
+
+def get_crypto_executor():
+    """Return the shared crypto executor configured by CRYPTO_EXECUTOR/CRYPTO_MAX_WORKERS"""
+    global _crypto_executor
+    
+    if _crypto_executor is None:
+        with _crypto_executor_lock:
+            if _crypto_executor is None:
+                _crypto_executor = create_crypto_executor(
+                    getattr(settings, 'CRYPTO_EXECUTOR', 'thread'),
+                    getattr(settings, 'CRYPTO_MAX_WORKERS', None),
+                )
+    return _crypto_executor
+
+
+def _capture(func, item, *args):
+    """Run func(item, *args), returning the exception instead of raising it"""
+    try:
+        return func(item, *args)
+    except Exception as e:
+        return e
+
+
+def _run_batch(func, items, key, executor, return_exceptions):
+    """Apply an RSA helper to every item, in order, on the crypto executor"""
+    items = list(items)
+    if executor is None:
+        executor = get_crypto_executor()
+    elif executor == 'serial':
+        executor = None
+    
+    if isinstance(executor, ProcessPoolExecutor):
+        if key is not None:
+            raise ValueError("Explicit RSA keys cannot be sent to crypto worker processes.")
+        args = [items]
+    else:
+        args = [items, [key] * len(items)]
+    
+    if return_exceptions:
+        args.insert(0, [func] * len(items))
+        func = _capture
+    
+    if executor is None or len(items) < 2:
+        return list(map(func, *args))
+    
+    chunksize = 1
+    if isinstance(executor, ProcessPoolExecutor):
+        # Amortise pickling/IPC overhead across several tokens per task
+        chunksize = max(1, len(items) // (executor._max_workers * 4))
+    return list(executor.map(func, *args, chunksize=chunksize))
+
+
+def encrypt_many(items, public_key=None, executor=None, return_exceptions=False):
+    """Encrypt a batch of payloads with encrypt_with_rsa, preserving order"""
+    return _run_batch(encrypt_with_rsa, items, public_key, executor, return_exceptions)
+
+
+def decrypt_many(encrypted_items, private_key=None, executor=None, return_exceptions=False):
+    """
+    Decrypt a batch of legacy RSA tokens, preserving order.
+    
+    ``executor`` defaults to the shared crypto executor; pass 'serial' to
+    run inline. With ``return_exceptions=True`` a failed item yields its
+    exception instead of aborting the whole batch.
+    """
+    return _run_batch(decrypt_legacy_token, encrypted_items, private_key, executor, return_exceptions)
+
+
+# Authenticated symmetric share tokens: "v2.<key id>.<base64url(nonce + AES-GCM ciphertext)>".
+# The server both produces and consumes share tokens, so an AEAD under a key
+# derived from the master key replaces the RSA envelope; RSA is only kept to
+# read tokens issued before this format existed.
+TOKEN_VERSION = 'v2'
+TOKEN_KEY_PURPOSE = 'share-token'
+
+
+@lru_cache(maxsize=32)
+def derive_key(master_key, purpose):
+    """Derive a 256-bit per-purpose key from a master key with HKDF-SHA256"""
+    if isinstance(master_key, str):
+        master_key = master_key.encode()
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=f'pmr:{purpose}'.encode(),
+    ).derive(master_key)
+
+
+def get_key_id(master_key):
+    """Short public identifier of a master key, embedded in token headers"""
+    return derive_key(master_key, 'key-id')[:4].hex()
+
+
+@lru_cache(maxsize=32)
+def _token_cipher(master_key):
+    return AESGCM(derive_key(master_key, TOKEN_KEY_PURPOSE))
+
+
+def _urlsafe_b64decode(data):
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def encrypt_token(data, master_key=None):
+    """Encrypt share token data, using SHARE_TOKEN_FORMAT ('aead' or legacy 'rsa')"""
+    if master_key is None and getattr(settings, 'SHARE_TOKEN_FORMAT', 'aead') == 'rsa':
+        return encrypt_with_rsa(data)
+    
+    if master_key is None:
+        master_key = get_master_keys()[0]
+    
+    if isinstance(data, dict):
+        data = json.dumps(data)
+    if isinstance(data, str):
+        data = data.encode()
+    
+    key_id = get_key_id(master_key)
+    header = f'{TOKEN_VERSION}.{key_id}'
+    nonce = os.urandom(12)
+    ciphertext = _token_cipher(master_key).encrypt(nonce, data, header.encode())
+    body = base64.urlsafe_b64encode(nonce + ciphertext).rstrip(b'=').decode()
+    return f'{header}.{body}'
+
+
+def is_legacy_token(encrypted_token):
+    """True for tokens in the RSA/hybrid (or bare Fernet) envelope"""
+    return not encrypted_token.startswith(f'{TOKEN_VERSION}.')
+
+
+def needs_rotation(encrypted_token):
+    """True if a token is not an AEAD token under the primary master key"""
+    if is_legacy_token(encrypted_token):
+        return True
+    return encrypted_token.split('.', 2)[1] != get_key_id(get_master_keys()[0])
+
+
+def decrypt_token(encrypted_token, master_key=None):
+    """Decrypt share token data in either the AEAD or the legacy RSA format"""
+    if is_legacy_token(encrypted_token):
+        return decrypt_legacy_token(encrypted_token)
+    
+    keys = get_master_keys() if master_key is None else (master_key,)
+    try:
+        version, key_id, body = encrypted_token.split('.')
+        master_key = next((key for key in keys if get_key_id(key) == key_id), None)
+        if master_key is None:
+            raise ValueError(f"Unknown key id: {key_id}")
+        raw = _urlsafe_b64decode(body)
+        decrypted = _token_cipher(master_key).decrypt(
+            raw[:12], raw[12:], f'{version}.{key_id}'.encode()
+        )
+        return json.loads(decrypted.decode())
+    except Exception as e:
+        raise ValueError(f"Failed to decrypt share token: {str(e)}")
+
+
+# Streaming file encryption for medical record files.
+#
+# Layout: header, then segments of AES-256-GCM ciphertext (+16-byte tag each).
+#   header  = MAGIC (8) | chunk size (4) | key id (4) | salt (16) | nonce prefix (7)
+#   nonce   = nonce prefix (7) | segment index (4) | last-segment flag (1)
+# Every segment is authenticated with the header as associated data, and the
+# last-segment flag detects truncation. The file key is derived from the
+# master key and the per-file salt, so each file has its own key. Segments
+# are independent, which gives constant memory and cheap range reads.
+STREAM_MAGIC = b'PMRSTRM1'
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_TAG_SIZE = 16
+STREAM_HEADER_SIZE = len(STREAM_MAGIC) + 4 + 4 + 16 + 7
+
+
+def _stream_cipher(master_key, salt):
+    file_key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        info=b'pmr:record-file',
+    ).derive(master_key)
+    return AESGCM(file_key)
+
+
+def _stream_nonce(prefix, index, last):
+    return prefix + index.to_bytes(4, 'big') + (b'\x01' if last else b'\x00')
+
+
+def _iter_source(src, chunk_size):
+    """Yield byte chunks from a Django File/UploadedFile, file object or iterable"""
+    if hasattr(src, 'chunks'):
+        yield from src.chunks(chunk_size)
+    elif hasattr(src, 'read'):
+        while True:
+            data = src.read(chunk_size)
+            if not data:
+                break
+            yield data
+    else:
+        yield from src
+
+
+def encrypt_chunks(src, master_key=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the streaming-encrypted form of ``src``, header first"""
+    if master_key is None:
+        master_key = get_master_keys()[0]
+    if isinstance(master_key, str):
+        master_key = master_key.encode()
+    
+    salt = os.urandom(16)
+    prefix = os.urandom(7)
+    header = (
+        STREAM_MAGIC + chunk_size.to_bytes(4, 'big')
+        + bytes.fromhex(get_key_id(master_key)) + salt + prefix
+    )
+    cipher = _stream_cipher(master_key, salt)
+    yield header
+    
+    # Re-cut the input into fixed-size segments, holding one segment back so
+    # the final one can be flagged
+    buffer = bytearray()
+    index = 0
+    for data in _iter_source(src, chunk_size):
+        buffer += data
+        while len(buffer) > chunk_size:
+            segment = bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+            yield cipher.encrypt(_stream_nonce(prefix, index, False), segment, header)
+            index += 1
+    yield cipher.encrypt(_stream_nonce(prefix, index, True), bytes(buffer), header)
+
+
+def encrypt_stream(src, dst, master_key=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Encrypt ``src`` (file, upload or iterable of bytes) into ``dst``; returns bytes written"""
+    written = 0
+    for data in encrypt_chunks(src, master_key, chunk_size):
+        dst.write(data)
+        written += len(data)
+    return written
+
+
+def _read_stream_header(src):
+    """Parse a stream header, returning (header bytes, chunk size, cipher, nonce prefix)"""
+    header = src.read(STREAM_HEADER_SIZE)
+    if len(header) != STREAM_HEADER_SIZE or not header.startswith(STREAM_MAGIC):
+        raise ValueError("Not a streaming-encrypted file.")
+    
+    offset = len(STREAM_MAGIC)
+    chunk_size = int.from_bytes(header[offset:offset + 4], 'big')
+    key_id = header[offset + 4:offset + 8].hex()
+    salt = header[offset + 8:offset + 24]
+    prefix = header[offset + 24:]
+    
+    master_key = next((key for key in get_master_keys() if get_key_id(key) == key_id), None)
+    if master_key is None:
+        raise ValueError(f"Unknown key id: {key_id}")
+    return header, chunk_size, _stream_cipher(master_key, salt), prefix
+
+
+def is_stream_encrypted(src):
+    """Check for the streaming header without moving the file position"""
+    position = src.tell()
+    try:
+        return src.read(len(STREAM_MAGIC)) == STREAM_MAGIC
+    finally:
+        src.seek(position)
+
+
+def encrypted_stream_size(plaintext_size, chunk_size=STREAM_CHUNK_SIZE):
+    """Size of the streaming-encrypted form of a plaintext of the given size"""
+    segments = max(1, -(-plaintext_size // chunk_size))
+    return STREAM_HEADER_SIZE + plaintext_size + segments * STREAM_TAG_SIZE
+
+
+def stream_plaintext_size(src):
+    """Plaintext size of a seekable streaming-encrypted file"""
+    src.seek(0)
+    _, chunk_size, _, _ = _read_stream_header(src)
+    body_size = src.seek(0, os.SEEK_END) - STREAM_HEADER_SIZE
+    segments = max(1, -(-body_size // (chunk_size + STREAM_TAG_SIZE)))
+    return body_size - segments * STREAM_TAG_SIZE
+
+
+def decrypt_chunks(src):
+    """Yield decrypted plaintext segments from a streaming-encrypted file object"""
+    header, chunk_size, cipher, prefix = _read_stream_header(src)
+    segment_size = chunk_size + STREAM_TAG_SIZE
+    
+    index = 0
+    segment = src.read(segment_size)
+    while True:
+        following = src.read(segment_size)
+        last = not following
+        try:
+            yield cipher.decrypt(_stream_nonce(prefix, index, last), segment, header)
+        except Exception:
+            raise ValueError(f"Encrypted file is corrupt or truncated at segment {index}.")
+        if last:
+            break
+        segment = following
+        index += 1
+
+
+def decrypt_stream(src, dst):
+    """Decrypt a streaming-encrypted file object into ``dst``; returns bytes written"""
+    written = 0
+    for data in decrypt_chunks(src):
+        dst.write(data)
+        written += len(data)
+    return written
+
+
+def decrypt_range(src, start, length):
+    """
+    Yield ``length`` plaintext bytes starting at ``start`` from a seekable
+    streaming-encrypted file, decrypting only the segments that overlap.
+    """
+    plaintext_size = stream_plaintext_size(src)
+    src.seek(0)
+    header, chunk_size, cipher, prefix = _read_stream_header(src)
+    segment_size = chunk_size + STREAM_TAG_SIZE
+    last_index = max(0, -(-plaintext_size // chunk_size) - 1)
+    
+    end = min(start + length, plaintext_size)
+    index = start // chunk_size
+    while start < end:
+        src.seek(STREAM_HEADER_SIZE + index * segment_size)
+        try:
+            plaintext = cipher.decrypt(
+                _stream_nonce(prefix, index, index == last_index),
+                src.read(segment_size),
+                header,
+            )
+        except Exception:
+            raise ValueError(f"Encrypted file is corrupt or truncated at segment {index}.")
+        offset = start - index * chunk_size
+        data = plaintext[offset:offset + end - start]
+        yield data
+        start += len(data)
+        index += 1
+
+
+ACCESS_SESSION_SALT = 'sharing.access-session'
+
+
+def sign_access_session(access_log):
+    """Signed handle letting a doctor continue an access session without re-logging"""
+    return signing.dumps(
+        {
+            'log': str(access_log.pk),
+            'token': str(access_log.share_token_id),
+            'doctor': str(access_log.doctor_id),
+        },
+        salt=ACCESS_SESSION_SALT,
+    )
+
+
+def load_access_session(handle, max_age=None):
+    """Return the data of a valid, unexpired session handle, or None"""
+    if max_age is None:
+        max_age = getattr(settings, 'SHARE_SESSION_MAX_AGE', 30 * 60)
+    try:
+        return signing.loads(handle, salt=ACCESS_SESSION_SALT, max_age=max_age)
+    except signing.BadSignature:
+        return None
+
+
 def create_share_token_data(patient_uuid, record_ids, expiry_hours=24):
     """Create token data for sharing"""
     expires_at = datetime.utcnow() + timedelta(hours=expiry_hours)
@@ -1,21 +1,39 @@
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from django.http import HttpResponse
 from .models import ShareToken, AccessLog, SavedPatient, DoctorNote
 from .serializers import (
     ShareTokenSerializer, CreateShareTokenSerializer, AccessLogSerializer,
-    SavedPatientSerializer, DoctorNoteSerializer
+    SavedPatientSerializer, SavedPatientPanelSerializer, DoctorNoteSerializer,
+    SharedRecordManifestSerializer, shared_record_url
 )
+from .batch import BatchError, parse_batch, run_batch
+from .cache import get_token_payload
+from .downloads import serve_record_file
+from .http import make_etag
+from .search import InvalidCursor, search_notes
+from .sync import InvalidSyncCursor, sync_changes
 from .utils import (
-    create_share_token_data, encrypt_with_rsa, decrypt_with_rsa,
-    generate_qr_code, create_share_url
+    create_share_token_data, encrypt_token, decrypt_token,
+    generate_qr_code, create_share_url, sign_access_session, load_access_session
 )
 from records.models import MedicalRecord
+from users.authentication import get_full_user
+from users.models import User
+from users.resolver import resolve_patient
+from users.serializers import UserProfileSerializer
+from users.throttling import ScanIPThrottle, ScanUserThrottle
 from django.conf import settings
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Substr
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.utils import timezone
-from datetime import timedelta, datetime
-import json
+from datetime import timedelta, datetime, timezone as dt_timezone
+
+PANEL_NOTE_SNIPPET_LENGTH = 160
+NOTE_SEARCH_MAX_LIMIT = 100
 
 
 class IsPatient(permissions.BasePermission):
@@ -28,12 +46,34 @@ class IsDoctor(permissions.BasePermission):
         return request.user and request.user.is_authenticated and request.user.role == 'DOCTOR'
 
 
+def _share_tokens_etag(request, *args, **kwargs):
+    """
+    ETag for a patient's token list: token changes (updated_at), deletions
+    (count), is_valid flipping (expired count) and edits to the nested
+    patient profile and shared records.
+    """
+    tokens = ShareToken.objects.filter(patient=request.user)
+    return make_etag(
+        request,
+        tokens.aggregate(
+            count=Count('pk'),
+            updated=Max('updated_at'),
+            expired=Count('pk', filter=Q(expires_at__lte=timezone.now())),
+            profile=Max('patient__updated_at'),
+        ),
+        MedicalRecord.objects.filter(share_tokens__in=tokens).aggregate(records=Max('updated_at')),
+    )
+
+
+@method_decorator(condition(etag_func=_share_tokens_etag), name='list')
 class ShareTokenListCreateView(generics.ListCreateAPIView):
     """List and create share tokens"""
     permission_classes = [IsPatient]
     
     def get_queryset(self):
-        return ShareToken.objects.filter(patient=self.request.user)
+        return ShareToken.objects.filter(patient=self.request.user).select_related(
+            'patient'
+        ).prefetch_related('records')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -78,28 +118,21 @@ class ShareTokenListCreateView(generics.ListCreateAPIView):
                 expiry_hours
             )
             
-            # Encrypt token data with RSA (with AES fallback)
+            # Encrypt token data (AEAD, or RSA when SHARE_TOKEN_FORMAT = 'rsa')
             try:
-                encrypted_token = encrypt_with_rsa(json.dumps(token_data))
+                encrypted_token = encrypt_token(token_data)
             except Exception as e:
                 import traceback
-                print(f"RSA encryption error: {str(e)}")
+                print(f"Token encryption error: {str(e)}")
                 print(traceback.format_exc())
-                # Fallback to AES encryption if RSA fails
-                try:
-                    from .utils import encrypt_data
-                    encrypted_token = encrypt_data(json.dumps(token_data))
-                    print("Using AES encryption fallback")
-                except Exception as aes_error:
-                    print(f"AES encryption also failed: {str(aes_error)}")
-                    return Response(
-                        {'error': f'Failed to encrypt token: {str(e)}'},
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                    )
+                return Response(
+                    {'error': f'Failed to encrypt token: {str(e)}'},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
             
             # Create share token
             share_token = ShareToken.objects.create(
-                patient=request.user,
+                patient=get_full_user(request),
                 encrypted_token=encrypted_token,
                 share_method=share_method,
                 expires_at=timezone.now() + timedelta(hours=expiry_hours),
@@ -174,8 +207,109 @@ def get_qr_code_image(request, token_id):
         )
 
 
+def _session_handle(request):
+    return request.META.get('HTTP_X_SHARE_SESSION') or request.query_params.get('session')
+
+
+def _resume_access_session(request, share_token):
+    """Return the AccessLog id of the doctor's open session on this token, if any"""
+    handle = _session_handle(request)
+    session = load_access_session(handle) if handle else None
+    if (
+        not session
+        or session['token'] != str(share_token.pk)
+        or session['doctor'] != str(request.user.pk)
+    ):
+        return None
+    return session['log']
+
+
+def _shared_records_response(request, share_token, token_data, access_log_id=None):
+    """
+    Log the access and return the shared records.
+    
+    With ``?view=manifest`` only a compact record manifest is returned; each
+    record's details and file are then fetched through the token-scoped
+    record endpoints.
+    
+    The first access opens a doctor session: one AccessLog row and one unit
+    of the access quota. Requests carrying the returned session handle (the
+    X-Share-Session header or ?session=) within SHARE_SESSION_MAX_AGE only
+    update that row's activity time and request count.
+    """
+    patient = resolve_patient(token_data.get('patient_uuid'))
+    if patient is None:
+        return Response(
+            {'error': 'Patient not found.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    records = MedicalRecord.objects.filter(id__in=token_data.get('record_ids'), is_deleted=False)
+    manifest = request.query_params.get('view') == 'manifest'
+    
+    updated = 0
+    if access_log_id:
+        now = timezone.now()
+        # .update() skips auto_now, so updated_at (read by sync) is set here
+        updated = AccessLog.objects.filter(
+            pk=access_log_id, share_token=share_token, doctor=request.user
+        ).update(
+            last_activity_at=now,
+            request_count=F('request_count') + 1,
+            updated_at=now
+        )
+    
+    if updated:
+        session = _session_handle(request)
+    elif access_log_id and not share_token.is_valid():
+        # The session's log row is gone, so this would be a new access
+        return Response(
+            {'error': 'Share token is no longer valid.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    else:
+        # Create access log
+        access_log = AccessLog.objects.create(
+            share_token=share_token,
+            doctor=request.user,
+            patient=patient,
+            ip_address=request.META.get('REMOTE_ADDR'),
+            user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            last_activity_at=timezone.now()
+        )
+        if not manifest:
+            # Manifest responses record each record as it is opened instead
+            access_log.accessed_records.set(records)
+        access_log_id = access_log.id
+        session = sign_access_session(access_log)
+        
+        # Increment access count
+        share_token.increment_access()
+    
+    # Return records (or just their manifest)
+    if manifest:
+        records_data = SharedRecordManifestSerializer(
+            records.only(
+                'id', 'file_name', 'file_type', 'file_size', 'document_type', 'date_of_record'
+            ),
+            many=True,
+            context={'request': request, 'share_token': share_token, 'session': session}
+        ).data
+    else:
+        from records.serializers import MedicalRecordSerializer
+        records_data = MedicalRecordSerializer(records, many=True, context={'request': request}).data
+    
+    return Response({
+        'patient': UserProfileSerializer(patient).data,
+        'records': records_data,
+        'access_log_id': str(access_log_id),
+        'share_token_id': str(share_token.id),
+        'session': session
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsDoctor])
+@throttle_classes([ScanUserThrottle, ScanIPThrottle])
 def scan_qr_code(request):
     """Scan and validate QR code"""
     encrypted_token = request.data.get('encrypted_token')
@@ -187,20 +321,15 @@ def scan_qr_code(request):
         )
     
     try:
-        # Decrypt token
-        # Try RSA decryption first, fallback to AES if needed
-        try:
-            token_data = json.loads(decrypt_with_rsa(encrypted_token))
-        except Exception as rsa_error:
-            # Fallback to AES decryption
-            from .utils import decrypt_data
-            token_data = decrypt_data(encrypted_token)
-        patient_uuid = token_data.get('patient_uuid')
-        record_ids = token_data.get('record_ids')
+        # Decrypt token (AEAD, or legacy RSA/AES envelopes)
+        token_data = decrypt_token(encrypted_token)
         expires_at = token_data.get('expires_at')
         
         # Check expiry
         expires_at_dt = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
+        if timezone.is_naive(expires_at_dt):
+            # Token timestamps are written as naive UTC
+            expires_at_dt = timezone.make_aware(expires_at_dt, dt_timezone.utc)
         if expires_at_dt < timezone.now():
             return Response(
                 {'error': 'Share token has expired.'},
@@ -219,37 +348,14 @@ def scan_qr_code(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if not share_token.is_valid():
+        access_log_id = _resume_access_session(request, share_token)
+        if not share_token.is_valid(ignore_access_limit=access_log_id is not None):
             return Response(
                 {'error': 'Share token is no longer valid.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get patient and records
-        from users.models import User
-        patient = User.objects.get(patient_uuid=patient_uuid, role='PATIENT')
-        records = MedicalRecord.objects.filter(id__in=record_ids, is_deleted=False)
-        
-        # Create access log
-        access_log = AccessLog.objects.create(
-            share_token=share_token,
-            doctor=request.user,
-            patient=patient,
-            ip_address=request.META.get('REMOTE_ADDR'),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
-        )
-        access_log.accessed_records.set(records)
-        
-        # Increment access count
-        share_token.increment_access()
-        
-        # Return records
-        from records.serializers import MedicalRecordSerializer
-        return Response({
-            'patient': UserProfileSerializer(patient).data,
-            'records': MedicalRecordSerializer(records, many=True, context={'request': request}).data,
-            'access_log_id': str(access_log.id)
-        })
+        return _shared_records_response(request, share_token, token_data, access_log_id)
     
     except Exception as e:
         return Response(
@@ -269,46 +375,16 @@ def access_via_url(request, token_id):
             is_revoked=False
         )
         
-        if not share_token.is_valid():
+        access_log_id = _resume_access_session(request, share_token)
+        if not share_token.is_valid(ignore_access_limit=access_log_id is not None):
             return Response(
                 {'error': 'Share token is no longer valid.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Decrypt token (try RSA first, fallback to AES)
-        try:
-            token_data = json.loads(decrypt_with_rsa(share_token.encrypted_token))
-        except Exception as rsa_error:
-            # Fallback to AES decryption
-            from .utils import decrypt_data
-            token_data = decrypt_data(share_token.encrypted_token)
-        patient_uuid = token_data.get('patient_uuid')
-        record_ids = token_data.get('record_ids')
-        
-        # Get patient and records
-        patient = User.objects.get(patient_uuid=patient_uuid, role='PATIENT')
-        records = MedicalRecord.objects.filter(id__in=record_ids, is_deleted=False)
-        
-        # Create access log
-        access_log = AccessLog.objects.create(
-            share_token=share_token,
-            doctor=request.user,
-            patient=patient,
-            ip_address=request.META.get('REMOTE_ADDR'),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
-        )
-        access_log.accessed_records.set(records)
-        
-        # Increment access count
-        share_token.increment_access()
-        
-        # Return records
-        from records.serializers import MedicalRecordSerializer
-        return Response({
-            'patient': UserProfileSerializer(patient).data,
-            'records': MedicalRecordSerializer(records, many=True, context={'request': request}).data,
-            'access_log_id': str(access_log.id)
-        })
+        # Decrypted payload, cached per token id (validity was checked above)
+        token_data = get_token_payload(share_token)
+        return _shared_records_response(request, share_token, token_data, access_log_id)
     
     except ShareToken.DoesNotExist:
         return Response(
@@ -317,6 +393,79 @@ def access_via_url(request, token_id):
         )
 
 
+def _get_shared_record(request, token_id, record_id):
+    """
+    Resolve a record inside a share the doctor has an open session on.
+    
+    Returns (record, access_log, error_response). Authorization uses the
+    token row and the signed session handle (X-Share-Session or ?session=,
+    valid for SHARE_SESSION_MAX_AGE) without decrypting the token; the
+    access quota was consumed when the session was opened.
+    """
+    try:
+        share_token = ShareToken.objects.get(id=token_id, is_revoked=False)
+    except ShareToken.DoesNotExist:
+        return None, None, Response(
+            {'error': 'Share token not found.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    if not share_token.is_valid(ignore_access_limit=True):
+        return None, None, Response(
+            {'error': 'Share token is no longer valid.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    access_log_id = _resume_access_session(request, share_token)
+    access_log = AccessLog.objects.filter(
+        pk=access_log_id, share_token=share_token, doctor=request.user
+    ).first() if access_log_id else None
+    if not access_log:
+        return None, None, Response(
+            {'error': 'Open the shared records (or renew the expired session) before viewing them.'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    record = share_token.records.filter(id=record_id, is_deleted=False).first()
+    if not record:
+        return None, None, Response(
+            {'error': 'Record not found in this share.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    return record, access_log, None
+
+
+@api_view(['GET'])
+@permission_classes([IsDoctor])
+def shared_record_detail(request, token_id, record_id):
+    """Get one shared record (second phase of a manifest response)"""
+    record, access_log, error = _get_shared_record(request, token_id, record_id)
+    if error:
+        return error
+    
+    # Track what the doctor actually opened in this session
+    access_log.accessed_records.add(record)
+    
+    from records.serializers import MedicalRecordSerializer
+    data = MedicalRecordSerializer(record, context={'request': request}).data
+    data['file_url'] = shared_record_url(
+        request, 'shared-record-file', token_id, record.id, _session_handle(request)
+    )
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsDoctor])
+def shared_record_file(request, token_id, record_id):
+    """Download a shared record file (supports Range and conditional GET)"""
+    record, _, error = _get_shared_record(request, token_id, record_id)
+    if error:
+        return error
+    
+    return serve_record_file(request, record)
+
+
 class SavedPatientListCreateView(generics.ListCreateAPIView):
     """List and create saved patients"""
     permission_classes = [IsDoctor]
@@ -325,12 +474,60 @@ class SavedPatientListCreateView(generics.ListCreateAPIView):
     search_fields = ['patient__full_name', 'patient__patient_uuid']
     
     def get_queryset(self):
-        return SavedPatient.objects.filter(doctor=self.request.user)
+        queryset = SavedPatient.objects.filter(doctor=self.request.user).select_related('patient')
+        patient_uuid = self.request.query_params.get('patient_uuid')
+        if patient_uuid:
+            # Resolved through the patient cache instead of joining on users
+            patient = resolve_patient(patient_uuid)
+            queryset = queryset.filter(patient=patient) if patient else queryset.none()
+        return queryset
     
     def perform_create(self, serializer):
         serializer.save(doctor=self.request.user)
 
 
+class SavedPatientPanelView(generics.ListAPIView):
+    """
+    Saved patients with activity summaries for the doctor's home screen.
+    
+    Each summary is a correlated subquery on the (doctor, patient, ...)
+    indexes, so the whole page is one query.
+    """
+    permission_classes = [IsDoctor]
+    serializer_class = SavedPatientPanelSerializer
+    
+    def get_queryset(self):
+        doctor_patient = {'doctor': OuterRef('doctor'), 'patient': OuterRef('patient')}
+        notes = DoctorNote.objects.filter(**doctor_patient).order_by()
+        latest_note = notes.order_by('-created_at')[:1]
+        active_shares = ShareToken.objects.filter(
+            patient=OuterRef('patient'),
+            access_logs__doctor=OuterRef('doctor'),
+            is_revoked=False,
+            expires_at__gt=timezone.now(),
+        ).order_by().values('patient').annotate(count=Count('pk', distinct=True)).values('count')
+        
+        return SavedPatient.objects.filter(doctor=self.request.user).select_related(
+            'patient'
+        ).only(
+            'id', 'doctor_id', 'last_consultation_date', 'saved_at',
+            'patient__id', 'patient__patient_uuid', 'patient__full_name',
+            'patient__gender', 'patient__date_of_birth', 'patient__blood_group',
+        ).annotate(
+            last_accessed_at=Subquery(
+                AccessLog.objects.filter(**doctor_patient).order_by('-accessed_at').values('accessed_at')[:1]
+            ),
+            note_count=Coalesce(Subquery(
+                notes.values('patient').annotate(count=Count('pk')).values('count')
+            ), 0),
+            latest_note_snippet=Subquery(latest_note.annotate(
+                snippet=Substr('note_text', 1, PANEL_NOTE_SNIPPET_LENGTH)
+            ).values('snippet')),
+            latest_note_at=Subquery(latest_note.values('created_at')),
+            active_share_count=Coalesce(Subquery(active_shares), 0),
+        ).order_by('-saved_at')
+
+
 class SavedPatientDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete saved patient"""
     permission_classes = [IsDoctor]
@@ -347,10 +544,10 @@ class DoctorNoteListCreateView(generics.ListCreateAPIView):
     filter_fields = ['patient']
     
     def get_queryset(self):
-        return DoctorNote.objects.filter(doctor=self.request.user)
+        return DoctorNote.objects.filter(doctor=self.request.user).select_related('doctor', 'patient')
     
     def perform_create(self, serializer):
-        serializer.save(doctor=self.request.user)
+        serializer.save(doctor=get_full_user(self.request))
 
 
 class DoctorNoteDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -362,11 +559,67 @@ class DoctorNoteDetailView(generics.RetrieveUpdateDestroyAPIView):
         return DoctorNote.objects.filter(doctor=self.request.user)
 
 
+@api_view(['GET'])
+@permission_classes([IsDoctor])
+def search_notes_view(request):
+    """
+    Search the doctor's own notes and consultation notes (``q``), newest
+    first; pass ``next_cursor`` back as ``cursor`` for the next page.
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'Search query is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), NOTE_SEARCH_MAX_LIMIT)
+    except ValueError:
+        return Response({'error': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        hits, next_cursor = search_notes(
+            request.user, query, cursor=request.query_params.get('cursor'), limit=limit
+        )
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    patients = User.objects.only('id', 'full_name', 'patient_uuid').in_bulk(
+        {hit['patient_id'] for hit in hits}
+    )
+    for hit in hits:
+        patient = patients.get(hit['patient_id'])
+        hit['patient_name'] = patient.full_name if patient else None
+        hit['patient_uuid'] = patient.patient_uuid if patient else None
+    return Response({'results': hits, 'next_cursor': next_cursor})
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def sync_view(request):
+    """Rows changed or deleted since ``cursor`` (everything without one); see sharing.sync"""
+    try:
+        data = sync_changes(request.user, request.query_params.get('cursor'), request)
+    except InvalidSyncCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+    return Response(data)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def batch_view(request):
+    """Run several GET requests in one round trip; see sharing.batch"""
+    try:
+        parsed = parse_batch(request.data)
+    except BatchError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'responses': run_batch(request, parsed, parallel=request.data.get('parallel') is True)})
+
+
 class AccessLogListView(generics.ListAPIView):
     """List access logs for doctor"""
     permission_classes = [IsDoctor]
     serializer_class = AccessLogSerializer
     
     def get_queryset(self):
-        return AccessLog.objects.filter(doctor=self.request.user)
+        return AccessLog.objects.filter(doctor=self.request.user).select_related(
+            'doctor', 'patient'
+        ).prefetch_related('accessed_records')
 
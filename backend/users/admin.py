@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, OTPVerification
+from .models import User, OTPVerification, NotificationOutbox
 
 
 @admin.register(User)
@@ -16,3 +16,11 @@ class OTPVerificationAdmin(admin.ModelAdmin):
     list_filter = ('purpose', 'is_used')
     readonly_fields = ('created_at',)
 
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'channel', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('channel', 'status')
+    search_fields = ('recipient',)
+    exclude = ('body',)
+    readonly_fields = ('created_at', 'sent_at')
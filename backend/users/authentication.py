@@ -0,0 +1,97 @@
+"""
+JWT authentication with a cached user principal.
+
+Enable with 'users.authentication.CachedJWTAuthentication' in
+REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'] (in place of simplejwt's
+JWTAuthentication).
+
+Only the columns permission checks and views read on every request
+(PRINCIPAL_FIELDS) are cached, keyed by user id, for AUTH_USER_CACHE_TTL
+seconds (default 10) in the Django cache. request.user is built from that
+row with every other field deferred; views that serialize or save the whole
+profile call get_full_user(request). users.signals drops the entry whenever
+a User is saved or deleted, and the TTL bounds staleness for bulk updates
+that bypass signals.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+User = get_user_model()
+
+PRINCIPAL_FIELDS = ('id', 'role', 'is_active', 'is_staff', 'is_superuser', 'patient_uuid')
+
+# Model.from_db expects values in concrete-field order
+_PRINCIPAL_ATTNAMES = tuple(
+    field.attname for field in User._meta.concrete_fields if field.attname in PRINCIPAL_FIELDS
+)
+
+PRINCIPAL_CACHE_PREFIX = 'auth:principal:'
+
+
+def principal_cache_key(user_id):
+    return f'{PRINCIPAL_CACHE_PREFIX}{user_id}'
+
+
+def invalidate_principal(user_id):
+    """Drop the cached principal for a user"""
+    cache.delete(principal_cache_key(user_id))
+
+
+def _load_principal(user_id):
+    """Principal row: PRINCIPAL_FIELDS values (model order) plus a password-hash digest"""
+    key = principal_cache_key(user_id)
+    row = cache.get(key)
+    if row is None:
+        row = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: user_id}
+        ).values_list(*_PRINCIPAL_ATTNAMES, 'password').first()
+        if row is None:
+            return None
+        # Only a digest of the hash is cached, for CHECK_REVOKE_TOKEN
+        row = (*row[:-1], get_md5_hash_password(row[-1]))
+        cache.set(key, row, getattr(settings, 'AUTH_USER_CACHE_TTL', 10))
+    return row
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that resolves the user from a short-lived cached principal"""
+    
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+        
+        row = _load_principal(user_id)
+        if row is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        
+        *values, password_digest = row
+        user = User.from_db(router.db_for_read(User), _PRINCIPAL_ATTNAMES, values)
+        
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_digest:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code='password_changed'
+                )
+        
+        return user
+
+
+def get_full_user(request):
+    """request.user with every field loaded (the cached principal defers most of them)"""
+    user = request.user
+    if user.is_authenticated and user.get_deferred_fields():
+        user = User.objects.get(pk=user.pk)
+        request.user = user
+    return user
@@ -0,0 +1,81 @@
+"""
+Password hashers with their work factors taken from settings.
+
+List them first in PASSWORD_HASHERS, keeping Django's defaults after them so
+existing hashes still verify:
+
+    PASSWORD_HASHERS = [
+        'users.hashing.PBKDF2PasswordHasher',
+        'users.hashing.Argon2PasswordHasher',   # needs argon2-cffi
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        ...
+    ]
+
+Work factors come from PASSWORD_PBKDF2_ITERATIONS and PASSWORD_ARGON2_TIME_COST /
+PASSWORD_ARGON2_MEMORY_COST / PASSWORD_ARGON2_PARALLELISM; pick them with
+``python manage.py calibrate_password_hashing``. The algorithm names are
+Django's, so a stored hash whose parameters differ from the settings is
+rehashed by User.check_password on the next successful login.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with PASSWORD_PBKDF2_ITERATIONS rounds"""
+    
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id with time, memory and parallelism costs from settings"""
+    
+    @property
+    def time_cost(self):
+        return getattr(settings, 'PASSWORD_ARGON2_TIME_COST', hashers.Argon2PasswordHasher.time_cost)
+    
+    @property
+    def memory_cost(self):
+        return getattr(settings, 'PASSWORD_ARGON2_MEMORY_COST', hashers.Argon2PasswordHasher.memory_cost)
+    
+    @property
+    def parallelism(self):
+        return getattr(settings, 'PASSWORD_ARGON2_PARALLELISM', hashers.Argon2PasswordHasher.parallelism)
+
+
+def time_hasher(hasher, samples=3, *encode_args):
+    """Best-of-``samples`` seconds for one encode() with the hasher's current parameters"""
+    salt = hasher.salt()
+    best = None
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.encode('calibration-password', salt, *encode_args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def calibrate_pbkdf2(target_seconds, samples=3, probe_iterations=100000):
+    """PBKDF2 iteration count whose hash takes about ``target_seconds`` on this host"""
+    best = time_hasher(hashers.PBKDF2PasswordHasher(), samples, probe_iterations)
+    # PBKDF2 cost is linear in iterations; round to keep settings readable
+    iterations = int(probe_iterations * target_seconds / best)
+    return max(10000, round(iterations, -4))
+
+
+def calibrate_argon2(target_seconds, memory_cost, parallelism, samples=3, max_time_cost=32):
+    """Smallest Argon2 time_cost (at the given memory/parallelism) reaching ``target_seconds``"""
+    hasher = hashers.Argon2PasswordHasher()
+    hasher.memory_cost = memory_cost
+    hasher.parallelism = parallelism
+    elapsed = None
+    for time_cost in range(1, max_time_cost + 1):
+        hasher.time_cost = time_cost
+        elapsed = time_hasher(hasher, samples)
+        if elapsed >= target_seconds:
+            return time_cost, elapsed
+    return max_time_cost, elapsed
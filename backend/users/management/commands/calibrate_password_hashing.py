@@ -0,0 +1,57 @@
+"""
+Pick password-hashing work factors for a latency target on this host.
+
+Usage: python manage.py calibrate_password_hashing --target-ms 200 [--hasher argon2]
+
+Prints the settings to use with users.hashing and the resulting login
+capacity per core (one hash per login, one core per hash).
+"""
+from django.contrib.auth.hashers import Argon2PasswordHasher, get_hasher
+from django.core.management.base import BaseCommand, CommandError
+
+from users.hashing import calibrate_argon2, calibrate_pbkdf2, time_hasher
+
+
+class Command(BaseCommand):
+    help = 'Benchmark password hashers and recommend work factors meeting a latency target'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=200, help='Target time per hash')
+        parser.add_argument('--hasher', choices=['pbkdf2', 'argon2'], default='pbkdf2')
+        parser.add_argument('--samples', type=int, default=3, help='Runs per measurement (best is kept)')
+        parser.add_argument('--memory-cost', type=int, default=Argon2PasswordHasher.memory_cost,
+                            help='Argon2 memory cost in KiB')
+        parser.add_argument('--parallelism', type=int, default=Argon2PasswordHasher.parallelism,
+                            help='Argon2 lanes')
+    
+    def handle(self, *args, **options):
+        target = options['target_ms'] / 1000
+        samples = options['samples']
+        
+        current = get_hasher('default')
+        elapsed = time_hasher(current, samples)
+        self.stdout.write(
+            f'Current default hasher {current.algorithm} ({type(current).__module__}.{type(current).__name__}): '
+            f'{elapsed * 1000:.1f} ms, ~{1 / elapsed:.1f} logins/s per core'
+        )
+        
+        if options['hasher'] == 'pbkdf2':
+            iterations = calibrate_pbkdf2(target, samples)
+            self.stdout.write(f'PASSWORD_PBKDF2_ITERATIONS = {iterations}')
+        else:
+            try:
+                time_cost, elapsed = calibrate_argon2(
+                    target, options['memory_cost'], options['parallelism'], samples
+                )
+            except ValueError as e:
+                # BasePasswordHasher._load_library raises ValueError without argon2-cffi
+                raise CommandError(str(e))
+            self.stdout.write(f'PASSWORD_ARGON2_TIME_COST = {time_cost}')
+            self.stdout.write(f"PASSWORD_ARGON2_MEMORY_COST = {options['memory_cost']}")
+            self.stdout.write(f"PASSWORD_ARGON2_PARALLELISM = {options['parallelism']}")
+            self.stdout.write(f'measured {elapsed * 1000:.1f} ms per hash')
+        
+        self.stdout.write(
+            f"~{1000 / options['target_ms']:.1f} logins/s per core at the target; stored hashes "
+            'are upgraded on each user\'s next successful login.'
+        )
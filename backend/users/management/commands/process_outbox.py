@@ -0,0 +1,128 @@
+"""
+Deliver pending NotificationOutbox rows.
+
+Usage: python manage.py process_outbox [--loop] [--batch-size 100] [--max-attempts 5]
+
+Rows are claimed in a short transaction with SELECT ... FOR UPDATE SKIP
+LOCKED (where the database supports it), so several workers can run side by
+side: claimed rows become SENDING with a --lease deadline and are delivered
+after the transaction commits, so no lock is held while the provider
+responds. A worker that dies mid-batch leaves its rows SENDING; they are
+claimed again once the lease runs out (each claim counts as an attempt).
+Results are only recorded on rows still in the claim that was sent, so a row
+superseded by a newer OTP (EXPIRED) or reclaimed meanwhile keeps that state.
+
+A failed delivery is retried after base * 2^(attempts-1) seconds (capped at
+--max-backoff) until --max-attempts, then marked FAILED. Rows past their
+expires_at (stale OTPs) are marked EXPIRED instead of being sent. Sent,
+failed and expired rows keep their metadata but their body is cleared.
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import NotificationOutbox
+from users.notifications import get_transport
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notifications with batching, retries and backoff'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--backoff', type=float, default=30.0, help='Base retry delay in seconds')
+        parser.add_argument('--max-backoff', type=float, default=3600.0)
+        parser.add_argument('--lease', type=float, default=300.0, help='Seconds a claimed batch stays reserved')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when idle')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Poll interval for --loop')
+    
+    def handle(self, *args, **options):
+        transport = get_transport()
+        try:
+            while True:
+                processed = self._process_batch(transport, options)
+                if processed:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        finally:
+            transport.close()
+    
+    def _claim_batch(self, options):
+        """Reserve a batch as SENDING; returns (deliverable, expired count, failed count)"""
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                NotificationOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status__in=['PENDING', 'SENDING'], next_attempt_at__lte=now)
+                .order_by('next_attempt_at')[:options['batch_size']]
+            )
+            expired = [n.pk for n in batch if n.expires_at and n.expires_at <= now]
+            # SENDING rows whose worker died on the last allowed attempt
+            exhausted = [
+                n.pk for n in batch
+                if n.pk not in expired and n.attempts >= options['max_attempts']
+            ]
+            deliverable = [n for n in batch if n.pk not in expired and n.pk not in exhausted]
+            if expired:
+                NotificationOutbox.objects.filter(pk__in=expired).update(status='EXPIRED', body='')
+            if exhausted:
+                NotificationOutbox.objects.filter(pk__in=exhausted).update(
+                    status='FAILED', body='', last_error='Delivery interrupted.'
+                )
+            for notification in deliverable:
+                notification.status = 'SENDING'
+                notification.attempts += 1
+                notification.next_attempt_at = now + timedelta(seconds=options['lease'])
+            NotificationOutbox.objects.bulk_update(deliverable, ['status', 'attempts', 'next_attempt_at'])
+        return deliverable, len(expired), len(exhausted)
+    
+    def _process_batch(self, transport, options):
+        deliverable, expired, failed = self._claim_batch(options)
+        claimed = len(deliverable) + expired + failed
+        if not claimed:
+            return 0
+        
+        # Delivered outside any transaction: provider latency holds no locks
+        results = transport.send_many(deliverable) if deliverable else []
+        
+        now = timezone.now()
+        sent = retried = superseded = 0
+        for notification, error in zip(deliverable, results):
+            if error is None:
+                changes = {'status': 'SENT', 'sent_at': now, 'body': '', 'last_error': ''}
+            elif notification.attempts >= options['max_attempts']:
+                changes = {'status': 'FAILED', 'body': '', 'last_error': str(error)}
+            else:
+                delay = min(options['backoff'] * 2 ** (notification.attempts - 1), options['max_backoff'])
+                # Jitter spreads retries of a failed batch
+                changes = {
+                    'status': 'PENDING',
+                    'next_attempt_at': now + timedelta(seconds=delay * random.uniform(1, 1.2)),
+                    'last_error': str(error),
+                }
+            # Only while still our claim: queue_otp may have expired the row
+            # meanwhile, or another worker reclaimed it after the lease
+            updated = NotificationOutbox.objects.filter(
+                pk=notification.pk, status='SENDING', attempts=notification.attempts
+            ).update(**changes)
+            if not updated:
+                superseded += 1
+            elif changes['status'] == 'SENT':
+                sent += 1
+            elif changes['status'] == 'FAILED':
+                failed += 1
+            else:
+                retried += 1
+        
+        self.stdout.write(
+            f"Batch of {claimed}: {sent} sent, {retried} retrying, {failed} failed, {expired} expired, "
+            f"{superseded} superseded"
+        )
+        return claimed
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:00
+
+from django.db import migrations, models
+from django.utils.crypto import salted_hmac
+
+
+def hash_existing_codes(apps, schema_editor):
+    """Keep only the newest unused OTP per (user, purpose) and hash every stored code"""
+    OTPVerification = apps.get_model('users', 'OTPVerification')
+    active_seen = set()
+    for otp in OTPVerification.objects.order_by('-created_at').iterator():
+        update_fields = ['otp_code']
+        if not otp.is_used:
+            key = (otp.user_id, otp.purpose)
+            if key in active_seen:
+                otp.is_used = True
+                update_fields.append('is_used')
+            active_seen.add(key)
+        # Same as users.models.hash_otp_code at the time of this migration
+        otp.otp_code = salted_hmac(
+            'users.OTPVerification', f'{otp.user_id}:{otp.purpose}:{otp.otp_code}', algorithm='sha256'
+        ).hexdigest()
+        otp.save(update_fields=update_fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='otpverification',
+            name='otp_code',
+            field=models.CharField(max_length=128),
+        ),
+        migrations.RunPython(hash_existing_codes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='otpverification',
+            index=models.Index(fields=['user', 'purpose', 'is_used', 'expires_at'], name='otp_verific_user_id_041048_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='otpverification',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_used', False)), fields=('user', 'purpose'), name='otp_one_active_per_user_purpose'),
+        ),
+    ]
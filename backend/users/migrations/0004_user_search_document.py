@@ -0,0 +1,98 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:06
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+SQLITE_FTS_CREATE = [
+    "CREATE VIRTUAL TABLE users_search USING fts5(user_id UNINDEXED, search_document)",
+    "INSERT INTO users_search (user_id, search_document) SELECT id, search_document FROM users",
+    """CREATE TRIGGER users_search_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_search (user_id, search_document) VALUES (new.id, new.search_document);
+    END""",
+    """CREATE TRIGGER users_search_update AFTER UPDATE OF search_document ON users BEGIN
+        DELETE FROM users_search WHERE user_id = old.id;
+        INSERT INTO users_search (user_id, search_document) VALUES (new.id, new.search_document);
+    END""",
+    """CREATE TRIGGER users_search_delete AFTER DELETE ON users BEGIN
+        DELETE FROM users_search WHERE user_id = old.id;
+    END""",
+]
+
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS users_search_insert",
+    "DROP TRIGGER IF EXISTS users_search_update",
+    "DROP TRIGGER IF EXISTS users_search_delete",
+    "DROP TABLE IF EXISTS users_search",
+]
+
+
+def build_documents(apps, schema_editor):
+    """Same normalization as users.search.build_search_document at the time of this migration"""
+    User = apps.get_model('users', 'User')
+    
+    def normalize(value):
+        value = unicodedata.normalize('NFKD', value)
+        value = ''.join(c for c in value if not unicodedata.combining(c))
+        return ' '.join(value.lower().split())
+    
+    batch = []
+    for user in User.objects.only(
+        'id', 'full_name', 'email', 'mobile_number', 'patient_uuid'
+    ).iterator(chunk_size=2000):
+        parts = [user.full_name, user.email]
+        if user.mobile_number:
+            parts.append(re.sub(r'\D', '', user.mobile_number))
+        if user.patient_uuid:
+            parts.append(str(user.patient_uuid))
+        user.search_document = normalize(' '.join(part for part in parts if part))
+        batch.append(user)
+        if len(batch) >= 2000:
+            User.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    if batch:
+        User.objects.bulk_update(batch, ['search_document'])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX users_search_document_trgm ON users USING gin (search_document gin_trgm_ops)"
+        )
+    elif vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                # users.search falls back to icontains
+                return
+        for statement in SQLITE_FTS_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS users_search_document_trgm")
+    elif vendor == 'sqlite':
+        for statement in SQLITE_FTS_DROP:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_notificationoutbox'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_search_document'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['patient_uuid', 'role'], name='users_patient_52d7a8_idx'),
+        ),
+    ]
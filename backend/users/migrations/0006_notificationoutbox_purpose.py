@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:31
+
+from django.db import migrations, models
+
+# users.notifications.OTP_SUBJECTS at the time of this migration
+SUBJECT_PURPOSES = {
+    'Verify your email': 'REGISTRATION',
+    'Reset your password': 'PASSWORD_RESET',
+}
+
+
+def backfill_purpose(apps, schema_editor):
+    NotificationOutbox = apps.get_model('users', 'NotificationOutbox')
+    for subject, purpose in SUBJECT_PURPOSES.items():
+        NotificationOutbox.objects.filter(subject=subject).update(purpose=purpose)
+
+
+def clear_failed_bodies(apps, schema_editor):
+    # Failed rows kept their body (and OTP) before this migration
+    NotificationOutbox = apps.get_model('users', 'NotificationOutbox')
+    NotificationOutbox.objects.filter(status='FAILED').exclude(body='').update(body='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_patient_uuid_role_index'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='purpose',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='notificationoutbox',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('SENDING', 'Sending'), ('SENT', 'Sent'), ('FAILED', 'Failed'), ('EXPIRED', 'Expired')], default='PENDING', max_length=10),
+        ),
+        migrations.RunPython(backfill_purpose, migrations.RunPython.noop),
+        migrations.RunPython(clear_failed_bodies, migrations.RunPython.noop),
+    ]
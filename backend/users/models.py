@@ -1,7 +1,13 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from datetime import timedelta
+import secrets
 import uuid
 
+from .search import SEARCH_SOURCE_FIELDS, build_search_document
+
 
 class UserManager(BaseUserManager):
     """Custom user manager"""
@@ -65,6 +71,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Normalized name/email/phone/patient UUID for admin search (users.search)
+    search_document = models.TextField(blank=True, default='', editable=False)
+    
     objects = UserManager()
     
     USERNAME_FIELD = 'email'
@@ -73,6 +82,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     class Meta:
         db_table = 'users'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['patient_uuid', 'role']),
+        ]
     
     def __str__(self):
         return f"{self.full_name} ({self.email})"
@@ -81,13 +93,33 @@ class User(AbstractBaseUser, PermissionsMixin):
         # Auto-generate patient UUID for patients
         if self.role == 'PATIENT' and not self.patient_uuid:
             self.patient_uuid = uuid.uuid4()
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            # Deferred source fields are unchanged, so the document is too
+            if not self.get_deferred_fields().intersection(SEARCH_SOURCE_FIELDS):
+                self.search_document = build_search_document(self)
+        elif set(update_fields).intersection(SEARCH_SOURCE_FIELDS):
+            self.search_document = build_search_document(self)
+            kwargs['update_fields'] = {*update_fields, 'search_document'}
         super().save(*args, **kwargs)
 
 
+def generate_otp_code():
+    return str(secrets.randbelow(900000) + 100000)
+
+
+def hash_otp_code(user_id, purpose, code):
+    """Keyed hash stored instead of the OTP (bound to the user and purpose)"""
+    return salted_hmac(
+        'users.OTPVerification', f'{user_id}:{purpose}:{code}', algorithm='sha256'
+    ).hexdigest()
+
+
 class OTPVerification(models.Model):
-    """OTP verification model"""
+    """OTP verification model (at most one unused OTP per user and purpose)"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='otp_verifications')
-    otp_code = models.CharField(max_length=6)
+    otp_code = models.CharField(max_length=128)  # hash_otp_code() of the code sent to the user
     purpose = models.CharField(max_length=50)  # 'REGISTRATION', 'PASSWORD_RESET'
     is_used = models.BooleanField(default=False)
     expires_at = models.DateTimeField()
@@ -96,7 +128,87 @@ class OTPVerification(models.Model):
     class Meta:
         db_table = 'otp_verifications'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'purpose', 'is_used', 'expires_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'purpose'],
+                condition=models.Q(is_used=False),
+                name='otp_one_active_per_user_purpose',
+            ),
+        ]
     
     def __str__(self):
         return f"OTP for {self.user.email} - {self.purpose}"
+    
+    @classmethod
+    def issue(cls, user, purpose, lifetime=timedelta(minutes=10)):
+        """
+        Generate a new 6-digit OTP, replacing the user's unused one for this
+        purpose. Returns (otp_obj, plaintext code); only the hash is stored.
+        """
+        code = generate_otp_code()
+        now = timezone.now()
+        # Used codes for this purpose are no longer needed once a new one exists
+        cls.objects.filter(user=user, purpose=purpose, is_used=True).delete()
+        otp_obj, _ = cls.objects.update_or_create(
+            user=user,
+            purpose=purpose,
+            is_used=False,
+            defaults={
+                'otp_code': hash_otp_code(user.pk, purpose, code),
+                'expires_at': now + lifetime,
+                'created_at': now,
+            }
+        )
+        return otp_obj, code
+    
+    def check_code(self, code):
+        """Constant-time comparison of a submitted code with the stored hash"""
+        return constant_time_compare(self.otp_code, hash_otp_code(self.user_id, self.purpose, code))
+    
+    def mark_used(self):
+        self.is_used = True
+        self.save(update_fields=['is_used'])
+
 
+class NotificationOutbox(models.Model):
+    """Outbound notification written in the sender's transaction and delivered by process_outbox"""
+    
+    CHANNEL_CHOICES = [
+        ('EMAIL', 'Email'),
+        ('SMS', 'SMS'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),  # Claimed by a worker until next_attempt_at
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+        ('EXPIRED', 'Expired'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES, default='EMAIL')
+    recipient = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255, blank=True)
+    purpose = models.CharField(max_length=50, blank=True)  # OTP purpose (a new OTP supersedes the pending row)
+    body = models.TextField()  # Cleared once delivered, failed or expired (may contain an OTP)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(null=True, blank=True)  # Not delivered after this
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'notification_outbox'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} - {self.status}"
@@ -0,0 +1,145 @@
+"""
+Outbound notifications (OTP email/SMS) through a database outbox.
+
+Request handlers only insert a NotificationOutbox row, inside the same
+transaction as the OTP it carries, so their latency does not depend on the
+delivery provider. ``python manage.py process_outbox`` delivers pending rows
+in batches with retries and exponential backoff.
+
+The transport is the dotted path in NOTIFICATION_TRANSPORT:
+
+- users.notifications.ConsoleTransport (default): writes to stdout
+- users.notifications.FileTransport: appends JSON lines to NOTIFICATION_FILE_PATH
+- users.notifications.EmailTransport: Django's email backend (EMAIL channel only)
+"""
+import json
+import sys
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import NotificationOutbox, OTPVerification
+
+OTP_LIFETIME = timedelta(minutes=10)
+
+OTP_SUBJECTS = {
+    'REGISTRATION': 'Verify your email',
+    'PASSWORD_RESET': 'Reset your password',
+}
+
+
+def queue_otp(user, purpose):
+    """
+    Issue an OTP and enqueue its delivery in one transaction.
+    Returns (otp_obj, plaintext code).
+    """
+    with transaction.atomic():
+        otp_obj, code = OTPVerification.issue(user, purpose, lifetime=OTP_LIFETIME)
+        # The previous code is dead now; don't deliver it (a worker already
+        # sending it leaves the row EXPIRED, see process_outbox)
+        NotificationOutbox.objects.filter(
+            user=user, purpose=purpose, status__in=['PENDING', 'SENDING']
+        ).update(status='EXPIRED', body='')
+        build_otp_notification(user, purpose, code, otp_obj.expires_at).save()
+    return otp_obj, code
+
+
+def build_otp_notification(user, purpose, code, expires_at):
+    """Unsaved outbox row carrying an OTP (bulk importers save these with bulk_create)"""
+    minutes = max(1, round((expires_at - timezone.now()).total_seconds() / 60))
+    return NotificationOutbox(
+        user=user,
+        channel='EMAIL',
+        recipient=user.email,
+        subject=OTP_SUBJECTS.get(purpose, 'Your verification code'),
+        purpose=purpose,
+        body=f"Your verification code is {code}. It expires in {minutes} minutes.",
+        expires_at=expires_at,
+    )
+
+
+class BaseTransport:
+    """Delivers outbox rows; ``send`` raises on failure"""
+    
+    def send(self, notification):
+        raise NotImplementedError
+    
+    def send_many(self, notifications):
+        """Deliver a batch; returns one exception (or None on success) per notification"""
+        results = []
+        for notification in notifications:
+            try:
+                self.send(notification)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
+    
+    def close(self):
+        pass
+
+
+class ConsoleTransport(BaseTransport):
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+    
+    def send(self, notification):
+        self.stream.write(
+            f"[{notification.channel}] to={notification.recipient} "
+            f"subject={notification.subject!r}\n{notification.body}\n"
+        )
+        self.stream.flush()
+
+
+class FileTransport(BaseTransport):
+    def __init__(self, path=None):
+        self.path = path or getattr(settings, 'NOTIFICATION_FILE_PATH', 'notifications.jsonl')
+    
+    def send(self, notification):
+        self.send_many([notification])
+    
+    def send_many(self, notifications):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for notification in notifications:
+                f.write(json.dumps({
+                    'id': notification.pk,
+                    'channel': notification.channel,
+                    'recipient': notification.recipient,
+                    'subject': notification.subject,
+                    'body': notification.body,
+                    'queued_at': notification.created_at.isoformat(),
+                }) + '\n')
+        return [None] * len(notifications)
+
+
+class EmailTransport(BaseTransport):
+    """Sends a batch over one connection of Django's EMAIL_BACKEND"""
+    
+    def __init__(self):
+        self.connection = get_connection()
+    
+    def send(self, notification):
+        if notification.channel != 'EMAIL':
+            raise ValueError(f'EmailTransport cannot deliver {notification.channel} notifications.')
+        EmailMessage(
+            subject=notification.subject,
+            body=notification.body,
+            to=[notification.recipient],
+            connection=self.connection,
+        ).send()
+    
+    def send_many(self, notifications):
+        self.connection.open()
+        return super().send_many(notifications)
+    
+    def close(self):
+        self.connection.close()
+
+
+def get_transport():
+    path = getattr(settings, 'NOTIFICATION_TRANSPORT', 'users.notifications.ConsoleTransport')
+    return import_string(path)()
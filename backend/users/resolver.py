@@ -0,0 +1,86 @@
+"""
+Patient lookup by patient_uuid.
+
+Doctor access (QR scan, share URL) and the admin audit trail resolve a patient
+from the patient_uuid in a share token or URL on every request. resolve_patient
+keeps the columns those responses serialize (PATIENT_FIELDS; never the password
+hash) in a bounded in-process LRU for PATIENT_CACHE_TTL seconds (default 300),
+and in the Django cache alias PATIENT_CACHE_BACKEND when set. users.signals
+drops the entry whenever the User is saved or deleted; the TTL bounds
+staleness for bulk updates that bypass signals.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+
+from .cache import TTLCache
+from .models import User
+
+PATIENT_FIELDS = (
+    'id', 'email', 'mobile_number', 'full_name', 'role', 'patient_uuid',
+    'date_of_birth', 'gender', 'blood_group', 'allergies', 'chronic_conditions',
+    'specialization', 'license_number', 'is_active', 'is_verified',
+    'created_at', 'updated_at',
+)
+
+# Model.from_db expects values in concrete-field order
+_PATIENT_ATTNAMES = tuple(
+    field.attname for field in User._meta.concrete_fields if field.attname in PATIENT_FIELDS
+)
+
+_patients = TTLCache(
+    maxsize=getattr(settings, 'PATIENT_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'PATIENT_CACHE_TTL', 300),
+)
+
+
+def _shared_cache():
+    alias = getattr(settings, 'PATIENT_CACHE_BACKEND', None)
+    return caches[alias] if alias else None
+
+
+def _patient_cache_key(patient_uuid):
+    return f'users:patient:{patient_uuid}'
+
+
+def resolve_patient(patient_uuid):
+    """
+    The PATIENT User with this patient_uuid, or None. Fields outside
+    PATIENT_FIELDS are deferred.
+    """
+    try:
+        patient_uuid = uuid.UUID(str(patient_uuid))
+    except ValueError:
+        return None
+    key = str(patient_uuid)
+    row = _patients.get(key)
+    
+    shared = _shared_cache()
+    if row is None and shared is not None:
+        row = shared.get(_patient_cache_key(key))
+        if row is not None:
+            _patients.set(key, row)
+    if row is None:
+        row = User.objects.filter(
+            patient_uuid=patient_uuid, role='PATIENT'
+        ).values_list(*_PATIENT_ATTNAMES).first()
+        if row is None:
+            return None
+        _patients.set(key, row)
+        if shared is not None:
+            shared.set(_patient_cache_key(key), row, _patients.ttl)
+    
+    return User.from_db(router.db_for_read(User), _PATIENT_ATTNAMES, row)
+
+
+def invalidate_patient(patient_uuid):
+    """Drop a cached patient (called from users.signals on save and delete)"""
+    if not patient_uuid:
+        return
+    key = str(patient_uuid)
+    _patients.delete(key)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_patient_cache_key(key))
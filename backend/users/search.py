@@ -0,0 +1,130 @@
+"""
+Admin user search.
+
+Every User keeps a normalized ``search_document`` (name, email, phone digits,
+patient UUID), refreshed in User.save() and by the bulk importer. Searches run
+in this order:
+
+  1. exact UUID (user id or patient_uuid): primary-key / unique index,
+  2. email (term contains '@'): prefix match on the unique email index,
+  3. phone (digits, spaces, +, -, parentheses): prefix match on mobile_number
+     or on the number's digits in search_document,
+  4. free text over search_document, ranked by relevance:
+     - PostgreSQL: trigram GIN index (pg_trgm), ordered by similarity,
+     - SQLite: FTS5 table ``users_search`` kept in sync by triggers, bm25 order,
+     - other databases: per-word ``icontains``.
+
+The indexes are created by migration users 0004.
+"""
+import re
+import unicodedata
+import uuid
+
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_SOURCE_FIELDS = ('full_name', 'email', 'mobile_number', 'patient_uuid')
+
+PHONE_RE = re.compile(r'^\+?[\d\s\-()]{4,}$')
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+_fts5_available = None
+
+
+def normalize_search_text(value):
+    """Lowercase, accent-free, single-spaced"""
+    value = unicodedata.normalize('NFKD', str(value))
+    value = ''.join(c for c in value if not unicodedata.combining(c))
+    return ' '.join(value.lower().split())
+
+
+def build_search_document(user):
+    """search_document value for a User (or any object with SEARCH_SOURCE_FIELDS)"""
+    parts = [user.full_name, user.email]
+    if user.mobile_number:
+        parts.append(re.sub(r'\D', '', user.mobile_number))
+    if user.patient_uuid:
+        parts.append(str(user.patient_uuid))
+    return normalize_search_text(' '.join(part for part in parts if part))
+
+
+def _parse_uuid(term):
+    try:
+        return uuid.UUID(term)
+    except ValueError:
+        return None
+
+
+def _has_fts5():
+    global _fts5_available
+    if _fts5_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_search'")
+            _fts5_available = cursor.fetchone() is not None
+    return _fts5_available
+
+
+def search_users(queryset, term, rank=True):
+    """
+    Filter a User queryset by an admin search term. With ``rank`` free-text
+    results are ordered by relevance; fast-path results keep the queryset order.
+    """
+    term = (term or '').strip()
+    if not term:
+        return queryset
+    
+    value = _parse_uuid(term)
+    if value is not None:
+        return queryset.filter(Q(pk=value) | Q(patient_uuid=value))
+    
+    if '@' in term:
+        return queryset.filter(Q(email__startswith=term) | Q(email__startswith=term.lower()))
+    
+    if PHONE_RE.match(term):
+        # Stored numbers keep their formatting; the document holds the bare digits
+        digits = re.sub(r'\D', '', term)
+        in_document = _filter_words(queryset.model.objects.all(), [digits], rank=False)
+        return queryset.filter(
+            Q(mobile_number__startswith=term)
+            | Q(mobile_number__startswith=digits)
+            | Q(pk__in=in_document.values('pk'))
+        )
+    
+    words = WORD_RE.findall(normalize_search_text(term))
+    if not words:
+        return queryset.none()
+    return _filter_words(queryset, words, rank)
+
+
+def _filter_words(queryset, words, rank):
+    """Rows whose search_document contains every word (as a prefix where the index allows)"""
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        
+        # ILIKE '%word%' is served by the gin_trgm_ops index
+        for word in words:
+            queryset = queryset.filter(search_document__contains=word)
+        if rank:
+            queryset = queryset.annotate(
+                search_rank=TrigramSimilarity('search_document', ' '.join(words))
+            ).order_by('-search_rank')
+        return queryset
+    
+    if connection.vendor == 'sqlite' and _has_fts5():
+        match = ' AND '.join(f'"{word}"*' for word in words)
+        queryset = queryset.filter(pk__in=RawSQL(
+            'SELECT user_id FROM users_search WHERE users_search MATCH %s', [match]
+        ))
+        if rank:
+            table = queryset.model._meta.db_table
+            queryset = queryset.annotate(search_rank=RawSQL(
+                'SELECT bm25(users_search) FROM users_search '
+                f'WHERE users_search MATCH %s AND users_search.user_id = "{table}"."id"',
+                [match], output_field=FloatField(),
+            )).order_by('search_rank')
+        return queryset
+    
+    for word in words:
+        queryset = queryset.filter(search_document__icontains=word)
+    return queryset
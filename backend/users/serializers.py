@@ -1,8 +1,11 @@
-from rest_framework import serializers
+from rest_framework import exceptions, serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from django.contrib.auth.models import update_last_login
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
 from .models import User, OTPVerification
-import random
-from datetime import datetime, timedelta
+from .notifications import queue_otp
 from django.utils import timezone
 
 
@@ -41,18 +44,11 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data.pop('password_confirm')
         password = validated_data.pop('password')
-        user = User.objects.create_user(password=password, **validated_data)
-        
-        # Generate static 6-digit OTP for email verification
-        otp = str(random.randint(100000, 999999))
-        OTPVerification.objects.create(
-            user=user,
-            otp_code=otp,
-            purpose='REGISTRATION',
-            expires_at=timezone.now() + timedelta(minutes=10)
-        )
-        
-        # TODO: Send OTP via email/SMS
+        with transaction.atomic():
+            user = User.objects.create_user(password=password, **validated_data)
+            
+            # Generate 6-digit OTP for email verification and queue its delivery
+            queue_otp(user, 'REGISTRATION')
         
         return user
 
@@ -69,6 +65,78 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'email', 'role', 'patient_uuid', 'is_verified', 'created_at', 'updated_at')
 
 
+# Compiled read path for nested profiles: UserProfileSerializer's fields are
+# bound once and their to_representation called directly per user, skipping
+# the per-object nested-serializer machinery. Output matches the serializer.
+_compiled_profile_fields = None
+
+
+def _get_compiled_profile_fields():
+    global _compiled_profile_fields
+    if _compiled_profile_fields is None:
+        _compiled_profile_fields = [
+            (name, field.source, field.to_representation)
+            for name, field in UserProfileSerializer().fields.items()
+        ]
+    return _compiled_profile_fields
+
+
+def serialize_user_profile(user):
+    """Serialize a User (or a ``values(*PROFILE_FIELDS)`` row) like UserProfileSerializer"""
+    is_row = isinstance(user, dict)
+    data = {}
+    for name, source, to_representation in _get_compiled_profile_fields():
+        value = user.get(source) if is_row else getattr(user, source)
+        data[name] = None if value is None else to_representation(value)
+    return data
+
+
+PROFILE_FIELDS = UserProfileSerializer.Meta.fields
+
+
+class UserProfileField(serializers.Field):
+    """Read-only nested user profile, same output as UserProfileSerializer"""
+    
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+    
+    def to_representation(self, value):
+        return serialize_user_profile(value)
+
+
+class InactiveAccount(exceptions.PermissionDenied):
+    default_detail = 'Account is not active. Please verify your email.'
+    default_code = 'inactive_account'
+
+
+class LoginSerializer(TokenObtainPairSerializer):
+    """Token pair for an active account; the authenticated user is kept on ``self.user``"""
+    
+    def validate(self, attrs):
+        # One lookup covers authentication, the activation check and the
+        # profile in the response (authenticate() hides inactive accounts)
+        try:
+            user = User._default_manager.get_by_natural_key(attrs[self.username_field])
+        except User.DoesNotExist:
+            # Hash anyway so unknown emails take as long as wrong passwords
+            User().set_password(attrs['password'])
+            user = None
+        
+        if user is None or not user.check_password(attrs['password']):
+            raise exceptions.AuthenticationFailed(
+                self.error_messages['no_active_account'], 'no_active_account'
+            )
+        if not user.is_active:
+            raise InactiveAccount()
+        
+        self.user = user
+        refresh = self.get_token(user)
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+
 class PasswordChangeSerializer(serializers.Serializer):
     old_password = serializers.CharField(required=True)
     new_password = serializers.CharField(required=True, validators=[validate_password])
@@ -96,7 +164,7 @@ class OTPVerificationSerializer(serializers.Serializer):
             purpose=attrs['purpose'],
             is_used=False,
             expires_at__gt=timezone.now()
-        ).order_by('-created_at').first()
+        ).first()
         
         if not otp_obj:
             # Check if there are any OTPs (even expired/used) to give better error message
@@ -119,7 +187,7 @@ class OTPVerificationSerializer(serializers.Serializer):
                 "otp_code": "Invalid or expired OTP. Please check your code or request a new one."
             })
         
-        if otp_obj.otp_code != attrs['otp_code']:
+        if not otp_obj.check_code(attrs['otp_code']):
             raise serializers.ValidationError({
                 "otp_code": "Invalid OTP code. Please check the code and try again."
             })
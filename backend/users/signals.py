@@ -0,0 +1,16 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_principal
+from .resolver import invalidate_patient
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_principal(sender, instance, **kwargs):
+    """Role changes, deactivation and password changes apply on the next request"""
+    invalidate_principal(instance.pk)
+    invalidate_patient(instance.patient_uuid)
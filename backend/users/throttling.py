@@ -0,0 +1,143 @@
+"""
+Token-bucket throttles for abuse-prone endpoints.
+
+Each throttle keys a bucket by scope and by the client IP, the submitted
+email or the authenticated user. A bucket holds up to N tokens and refills
+at N per period for a rate "N/period" (s, min, hour, day), so short bursts
+pass and sustained floods are held to the rate. A rejected request gets 429
+with Retry-After (DRF's Throttled handling).
+
+Rates come from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'][scope], falling back
+to DEFAULT_RATES. Buckets live in a bounded in-process LRU; set
+THROTTLE_CACHE_BACKEND to a Django cache alias to share them between
+processes (updates are read-modify-write, so limits are approximate under
+heavy concurrency).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .cache import TTLCache
+
+DEFAULT_RATES = {
+    'login_ip': '30/min',
+    'login_email': '10/min',
+    'otp_ip': '20/hour',
+    'otp_email': '5/hour',
+    'scan_ip': '120/min',
+    'scan_user': '60/min',
+}
+
+PERIODS = {'s': 1, 'min': 60, 'hour': 3600, 'day': 86400}
+
+_local_buckets = TTLCache(maxsize=getattr(settings, 'THROTTLE_LOCAL_MAX_KEYS', 10000))
+_local_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """'5/min' -> (5, 60)"""
+    num, _, period = rate.partition('/')
+    return int(num), PERIODS[period]
+
+
+def _shared_cache():
+    alias = getattr(settings, 'THROTTLE_CACHE_BACKEND', None)
+    return caches[alias] if alias else None
+
+
+def take_token(key, capacity, period, now=None):
+    """
+    Take one token from the bucket under ``key``. Returns 0 when allowed,
+    otherwise the seconds until a token is available.
+    """
+    shared = _shared_cache()
+    if now is None:
+        # Shared buckets need wall-clock time: monotonic clocks differ per process
+        now = time.time() if shared is not None else time.monotonic()
+    refill = capacity / period
+    
+    def consume(state):
+        tokens, updated = state if state else (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * refill)
+        if tokens >= 1:
+            return (tokens - 1, now), 0
+        return (tokens, now), (1 - tokens) / refill
+    
+    if shared is not None:
+        state, wait = consume(shared.get(key))
+        shared.set(key, state, period)
+        return wait
+    
+    with _local_lock:
+        state, wait = consume(_local_buckets.get(key))
+        # An idle bucket refills completely within one period
+        _local_buckets.set(key, state, period)
+    return wait
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base class: subclasses set ``scope`` and implement ``get_bucket_ident``"""
+    scope = None
+    
+    def get_rate(self):
+        rates = api_settings.DEFAULT_THROTTLE_RATES or {}
+        return rates.get(self.scope) or DEFAULT_RATES[self.scope]
+    
+    def get_bucket_ident(self, request, view):
+        """Identity to limit, or None to skip this throttle for the request"""
+        raise NotImplementedError
+    
+    def allow_request(self, request, view):
+        ident = self.get_bucket_ident(request, view)
+        if ident is None:
+            return True
+        capacity, period = parse_rate(self.get_rate())
+        self._wait = take_token(f'throttle:{self.scope}:{ident}', capacity, period)
+        return self._wait == 0
+    
+    def wait(self):
+        return self._wait
+
+
+class IPThrottle(TokenBucketThrottle):
+    def get_bucket_ident(self, request, view):
+        return self.get_ident(request)
+
+
+class EmailThrottle(TokenBucketThrottle):
+    def get_bucket_ident(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+class UserThrottle(TokenBucketThrottle):
+    def get_bucket_ident(self, request, view):
+        return request.user.pk if request.user and request.user.is_authenticated else None
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class LoginEmailThrottle(EmailThrottle):
+    scope = 'login_email'
+
+
+class OTPIPThrottle(IPThrottle):
+    scope = 'otp_ip'
+
+
+class OTPEmailThrottle(EmailThrottle):
+    scope = 'otp_email'
+
+
+class ScanIPThrottle(IPThrottle):
+    scope = 'scan_ip'
+
+
+class ScanUserThrottle(UserThrottle):
+    scope = 'scan_user'
@@ -1,5 +1,5 @@
 from rest_framework import status, generics, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
@@ -7,11 +7,13 @@ from django.contrib.auth import get_user_model
 from django.conf import settings
 from .serializers import (
     UserRegistrationSerializer, UserProfileSerializer, PasswordChangeSerializer,
-    OTPVerificationSerializer, PasswordResetRequestSerializer, PasswordResetSerializer
+    OTPVerificationSerializer, PasswordResetRequestSerializer, PasswordResetSerializer,
+    LoginSerializer, InactiveAccount
 )
+from .authentication import get_full_user
 from .models import OTPVerification
-import random
-from datetime import timedelta
+from .notifications import queue_otp
+from .throttling import LoginEmailThrottle, LoginIPThrottle, OTPEmailThrottle, OTPIPThrottle
 from django.utils import timezone
 
 User = get_user_model()
@@ -49,8 +51,7 @@ class VerifyOTPView(generics.GenericAPIView):
         otp_obj = serializer.validated_data['otp_obj']
         
         # Mark OTP as used
-        otp_obj.is_used = True
-        otp_obj.save()
+        otp_obj.mark_used()
         
         # Activate user account
         if serializer.validated_data['purpose'] == 'REGISTRATION':
@@ -86,32 +87,32 @@ class VerifyOTPView(generics.GenericAPIView):
 class LoginView(TokenObtainPairView):
     """Custom login view"""
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
+    serializer_class = LoginSerializer
     
     def post(self, request, *args, **kwargs):
-        response = super().post(request, *args, **kwargs)
-        
-        if response.status_code == 200:
-            user = User.objects.get(email=request.data.get('email'))
-            if not user.is_active:
-                return Response({
-                    'error': 'Account is not active. Please verify your email.'
-                }, status=status.HTTP_403_FORBIDDEN)
-            
-            response.data['user'] = UserProfileSerializer(user).data
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except InactiveAccount as e:
+            return Response({'error': e.detail}, status=status.HTTP_403_FORBIDDEN)
         
-        return response
+        data = serializer.validated_data
+        data['user'] = UserProfileSerializer(serializer.user).data
+        return Response(data, status=status.HTTP_200_OK)
 
 
 @api_view(['GET', 'PUT'])
 @permission_classes([permissions.IsAuthenticated])
 def profile_view(request):
     """Get or update user profile"""
+    user = get_full_user(request)
     if request.method == 'GET':
-        serializer = UserProfileSerializer(request.user)
+        serializer = UserProfileSerializer(user)
         return Response(serializer.data)
     
     elif request.method == 'PUT':
-        serializer = UserProfileSerializer(request.user, data=request.data, partial=True)
+        serializer = UserProfileSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -124,7 +125,7 @@ def change_password(request):
     """Change user password"""
     serializer = PasswordChangeSerializer(data=request.data)
     if serializer.is_valid():
-        user = request.user
+        user = get_full_user(request)
         if not user.check_password(serializer.validated_data['old_password']):
             return Response(
                 {'old_password': 'Wrong password.'},
@@ -140,22 +141,15 @@ def change_password(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([OTPIPThrottle, OTPEmailThrottle])
 def request_password_reset(request):
     """Request password reset OTP"""
     serializer = PasswordResetRequestSerializer(data=request.data)
     if serializer.is_valid():
         user = User.objects.get(email=serializer.validated_data['email'])
         
-        # Generate static 6-digit OTP
-        otp = str(random.randint(100000, 999999))
-        OTPVerification.objects.create(
-            user=user,
-            otp_code=otp,
-            purpose='PASSWORD_RESET',
-            expires_at=timezone.now() + timedelta(minutes=10)
-        )
-        
-        # TODO: Send OTP via email/SMS
+        # Generate 6-digit OTP (replaces any unused reset OTP) and queue its delivery
+        queue_otp(user, 'PASSWORD_RESET')
         
         return Response({
             'message': 'Password reset OTP sent to your email.'
@@ -184,17 +178,16 @@ def reset_password(request):
             purpose='PASSWORD_RESET',
             is_used=False,
             expires_at__gt=timezone.now()
-        ).order_by('-created_at').first()
+        ).first()
         
-        if not otp_obj or otp_obj.otp_code != serializer.validated_data['otp_code']:
+        if not otp_obj or not otp_obj.check_code(serializer.validated_data['otp_code']):
             return Response(
                 {'otp_code': 'Invalid or expired OTP.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         # Mark OTP as used and reset password
-        otp_obj.is_used = True
-        otp_obj.save()
+        otp_obj.mark_used()
         user.set_password(serializer.validated_data['new_password'])
         user.save()
         
@@ -219,6 +212,7 @@ def logout_view(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([OTPIPThrottle, OTPEmailThrottle])
 def resend_otp(request):
     """Resend OTP for email verification"""
     email = request.data.get('email')
@@ -238,14 +232,8 @@ def resend_otp(request):
             status=status.HTTP_404_NOT_FOUND
         )
     
-    # Generate new OTP
-    otp = str(random.randint(100000, 999999))
-    OTPVerification.objects.create(
-        user=user,
-        otp_code=otp,
-        purpose=purpose,
-        expires_at=timezone.now() + timedelta(minutes=10)
-    )
+    # Generate new OTP (replaces the previous unused one) and queue its delivery
+    otp_obj, otp = queue_otp(user, purpose)
     
     response_data = {
         'message': f'New OTP sent to {email}.',
@@ -256,7 +244,5 @@ def resend_otp(request):
         response_data['otp_code'] = otp
         response_data['debug_note'] = 'OTP shown only in DEBUG mode.'
     
-    # TODO: Send OTP via email/SMS
-    
     return Response(response_data, status=status.HTTP_200_OK)
 